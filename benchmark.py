@@ -0,0 +1,114 @@
+#! /usr/bin/python
+# How long does the planner take? Run ./benchmark.py to find out.
+#
+# We measure startup time: how long each planner_cli.py subcommand takes
+# from the moment you press enter until it's done, compared to how long
+# Python itself takes to start. Each command runs several times and we keep
+# the fastest and the median run, since the first run is often slowed down
+# by the disk. We also check that a check never imports the heavy modules
+# (jinja2 and requests) at all.
+#
+# We also measure memory: how much each stage of a build keeps and how much
+# it needs at its peak, and how many bytes the model uses per menu row.
+#
+# Pass --json to get the numbers as JSON, so they can be saved and compared
+# from one version of the planner to the next.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PLANNER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules which a quick command should never need to import
+HEAVY_MODULES = ['jinja2', 'requests']
+
+def time_command(command, runs):
+    "Run a command several times, returning the fastest and median times in ms"
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for run in range(runs):
+            start = time.time()
+            # A check exits with 1 when it finds errors in the spreadsheets,
+            # so we don't treat that as the command failing.
+            subprocess.call(command, cwd=PLANNER_DIR, stdout=devnull,
+                    stderr=devnull)
+            times.append((time.time() - start) * 1000)
+    times.sort()
+    return {'min_ms': round(times[0], 1), 'median_ms': round(times[len(times) / 2], 1)}
+
+def heavy_imports(subcommand):
+    "Return the heavy modules imported by a subcommand"
+    # We run the subcommand in a fresh Python, and have it tell us which
+    # heavy modules ended up in sys.modules.
+    script = ("import sys, os, planner_cli\n" +
+        "sys.stdout = open(os.devnull, 'w')\n" +
+        "planner_cli.main(%r)\n" % subcommand +
+        "sys.stdout = sys.__stdout__\n" +
+        "print ' '.join(m for m in %r if m in sys.modules)\n" % HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', script],
+            cwd=PLANNER_DIR)
+    return output.split()
+
+def startup_benchmark(runs):
+    "Time Python's own startup and each subcommand"
+    buildDir = tempfile.mkdtemp()
+    commands = [
+        ('python', [sys.executable, '-c', 'pass']),
+        ('check', [sys.executable, 'planner_cli.py', 'check']),
+        ('export', [sys.executable, 'planner_cli.py', 'export']),
+        ('build', [sys.executable, 'planner_cli.py', 'build', '-o', buildDir])
+    ]
+    results = {}
+    for name, command in commands:
+        results[name] = time_command(command, runs)
+    results['check']['heavy_imports'] = heavy_imports(['check'])
+    return results
+
+# Build the reports with a memory profile, and keep the numbers we track
+# from one version to the next. bytes_per_menu_row is the one to watch: if
+# it grows, the model started keeping more than it needs to for each row.
+def memory_benchmark():
+    "Measure the memory used to build the model and its reports"
+    buildDir = tempfile.mkdtemp()
+    output = subprocess.check_output([sys.executable, 'planner_cli.py',
+            'build', '--memory-profile', 'json', '-o', buildDir], cwd=PLANNER_DIR)
+    profile = json.loads(output)
+    results = dict((name, {'value': value}) for name, value in
+            profile['metrics'].items())
+    for stage in profile['stages']:
+        results[stage['stage']] = {
+            'retained_bytes': stage['retained_bytes'],
+            'peak_bytes': stage['peak_bytes']
+        }
+    return results
+
+def print_results(results):
+    for section, measurements in sorted(results.items()):
+        print section
+        for name, values in sorted(measurements.items()):
+            print "  %-10s %s" % (name, ', '.join("%s=%s" % item
+                    for item in sorted(values.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the planner")
+    parser.add_argument('--runs', '-n', type=int, default=5,
+            help="How many times to run each command")
+    parser.add_argument('--json', default=False, action="store_true",
+            help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        'startup': startup_benchmark(args.runs),
+        'memory': memory_benchmark()
+    }
+    if args.json:
+        print json.dumps(results, indent=2, sort_keys=True)
+    else:
+        print_results(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import re
+
+# How many pounds one of each unit weighs. Everything else (cups, cans,
+# dozens) has no weight we can know, so we count those items separately.
+POUNDS_PER_UNIT = {
+    "lb": 1.0,
+    "pound": 1.0,
+    "oz": 1.0 / 16,
+    "ounce": 1.0 / 16,
+    "kg": 2.20462,
+    "kilogram": 2.20462,
+    "g": 0.00220462,
+    "gram": 0.00220462
+}
+
+# Which containers each storage location is packed into, and whether it's
+# kept frozen or just chilled. Frozen food goes at the bottom of the same
+# coolers as the chilled food.
+CONTAINERS = {
+    "cooler": ('Cooler', 'chilled'),
+    "cooler (frozen)": ('Cooler', 'frozen'),
+    "drybox": ('Drybox', None)
+}
+
+MEAL_NAMES = {
+    '1B': 'Breakfast',
+    '2L': 'Lunch',
+    '3D': 'Dinner'
+}
+
+# A ConsumptionTimeline follows the coolers and dryboxes through the trip:
+# what comes out of each one at every meal, how much frozen and chilled
+# food is left at the end of each day, and when each one is empty and can
+# be retired (or doesn't need more ice).
+#
+# The menu is turned into a row of numbers for each container, one number
+# per meal: the pounds of food that come out at that meal. Adding up each
+# row as we go along (a running total, or "prefix sum") tells us how much
+# has come out by any meal, so what's left is just the starting weight
+# minus the running total. That takes one pass over the menu items and one
+# pass over the meals, rather than looking through the menu again for
+# every day.
+class ConsumptionTimeline(object):
+    "Work out what's left in each cooler and drybox, meal by meal"
+
+    def __init__(self, model):
+        self.model = model
+
+    def compute(self):
+        "Return the data for a timeline report"
+        schedule = self.model.meals()
+        mealIndex = dict(((m['day'], m['meal']), i) for i, m in enumerate(schedule))
+
+        # One pass over the menu items, dropping each one into its
+        # container's row at its meal
+        containers = {}
+        for item in self.model.menuItems:
+            if not item['storage'] in CONTAINERS or item['mealType'] == 'Snacks':
+                continue
+            index = mealIndex.get((item['day'], item['meal']))
+            if index is None:
+                continue
+            kind, temperature = CONTAINERS[item['storage']]
+            name = "%s %s" % (kind, self.model.get_bag_number(item)[1])
+            container = containers.get(name)
+            if container is None:
+                container = containers[name] = {
+                    'name': name,
+                    'kind': kind,
+                    'pounds': [0.0] * len(schedule),
+                    'frozen': [0.0] * len(schedule),
+                    'chilled': [0.0] * len(schedule),
+                    'items': [[] for meal in schedule]
+                }
+            pounds = self.pounds(item)
+            if pounds is not None:
+                container['pounds'][index] += pounds
+                if temperature:
+                    container[temperature][index] += pounds
+            container['items'][index].append({
+                'name': item['name'],
+                'quantity': item['quantity'],
+                'unit': item['unit'],
+                'pounds': pounds
+            })
+
+        # Then one pass over the meals for each container
+        names = sorted(containers, key=self.container_order)
+        for name in names:
+            container = containers[name]
+            for row in ['pounds', 'frozen', 'chilled']:
+                container[row + 'Left'] = self.remaining(container[row])
+            lastMeal = max(i for i, items in enumerate(container['items']) if items)
+            container['emptiesAfter'] = self.describe(schedule[lastMeal])
+            container['emptiesAfterIndex'] = lastMeal
+
+        days = []
+        for index, meal in enumerate(schedule):
+            if not days or days[-1]['day'] != meal['day']:
+                days.append({'day': meal['day'], 'meals': [], 'emptied': []})
+            day = days[-1]
+            leaving = [{'container': name, 'items': containers[name]['items'][index]}
+                    for name in names if containers[name]['items'][index]]
+            day['meals'].append({'name': MEAL_NAMES.get(meal['meal'], meal['meal']),
+                    'leaving': leaving})
+            # Whatever's left after a day's last meal is what's left that day
+            day['frozenLeft'] = sum(containers[n]['frozenLeft'][index] for n in names)
+            day['chilledLeft'] = sum(containers[n]['chilledLeft'][index] for n in names)
+            day['emptied'].extend(n for n in names
+                    if containers[n]['emptiesAfterIndex'] == index)
+
+        return {
+            'containers': [{
+                'name': name,
+                'kind': containers[name]['kind'],
+                'pounds': sum(containers[name]['pounds']),
+                'frozen': sum(containers[name]['frozen']),
+                'chilled': sum(containers[name]['chilled']),
+                'itemCount': sum(len(items) for items in containers[name]['items']),
+                'unweighedCount': sum(1 for items in containers[name]['items']
+                        for item in items if item['pounds'] is None),
+                'emptiesAfter': containers[name]['emptiesAfter']
+            } for name in names],
+            'days': days
+        }
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def remaining(self, amounts):
+        "Return how much is left after each meal, given how much leaves at each"
+        left = sum(amounts)
+        remaining = []
+        for amount in amounts:
+            left -= amount
+            # Adding and subtracting floats leaves crumbs like 1e-15
+            remaining.append(round(left, 6))
+        return remaining
+
+    def pounds(self, item):
+        "Return how many pounds a menu item weighs, or None if we can't tell"
+        unit = re.sub(r"[^a-z]", '', item['unit'].lower())
+        if unit.endswith('s') and unit[:-1] in POUNDS_PER_UNIT:
+            unit = unit[:-1]
+        if unit in POUNDS_PER_UNIT:
+            return item['quantity'] * POUNDS_PER_UNIT[unit]
+        return None
+
+    def describe(self, meal):
+        return "Day %s %s" % (meal['day'], MEAL_NAMES.get(meal['meal'], meal['meal']))
+
+    def container_order(self, name):
+        "Sort coolers before dryboxes, and Cooler 2 before Cooler 10"
+        kind, number = name.split(' ')
+        return (kind != 'Cooler', int(number))
@@ -0,0 +1,467 @@
+#! /usr/bin/python
+# Does every fast way of building the reports give exactly the same answer
+# as the slow, simple way? Run ./differential_check.py to find out.
+#
+# We make up random (but valid) ingredients, menus and purchases
+# spreadsheets, and build the data for the buy list, final buy list, pack
+# list and cook list (and the accessors they're built from) from them
+# several ways:
+#   reference: FoodPlannerModel's compute_ methods, called directly. This
+#              is the plain version everything else has to agree with.
+#   cached:    FoodPlannerModel's get_ methods, which cache and freeze the
+#              data. We ask twice, and check the second (cached) answer.
+#   sqlite:    SQLiteFoodPlannerModel, which answers with indexed queries
+#   pipeline:  a model loaded by PlannerPipeline, which reads and renders
+#              in several threads. We also check that the files it builds
+#              are byte for byte the same as a normal build's, and that
+#              building again rewrites nothing until a template changes.
+#   feed:      a model whose purchase totals come from a PurchasesFeed.
+#              We also append, edit and delete purchases, and type half a
+#              row, checking the feed against a freshly loaded model after
+#              each change.
+# Each one is timed, so one run tells you both whether the fast versions
+# are right and how much faster they are.
+#
+# If anything differs, we say where, keep the spreadsheets that caused it,
+# and exit with an error. Rerun with --seed to get the same spreadsheets.
+import argparse
+import csv
+import filecmp
+import json
+import os
+import random
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+
+PLANNER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PLANNER_DIR)
+
+from planner_settings import INGREDIENTS, MENUS, PURCHASES
+from food_planner_model import FoodPlannerModel, STORAGE_LOCATIONS
+
+REPORTS = ['buy_list', 'final_buy_list', 'pack_list', 'cook_list']
+
+# The accessors the reports are built from. Every model answers these
+# its own way, so we compare them too, with ingredients_for asked about
+# every meal.
+ACCESSORS = ['menu_item_totals', 'meals', 'store_names', 'ingredients_for']
+
+STORES = ['Costco', "TJ's", 'Whole Foods', 'Safeway']
+FOODS = ['almond', 'tortilla', 'salsa', 'cheddar', 'rice', 'bean', 'cumin',
+        'coffee', 'apple', 'bacon', 'egg', 'pasta', 'olive oil', 'chocolate']
+UNITS = ['oz', 'lb', 'lbs', 'cup', 'cups', 'count', 'can', 'tbsp']
+MEALS = ['1B', '2L', '3D']
+
+# ===============
+# Making up spreadsheets
+# ===============
+
+def write_spreadsheets(folder, seed, ingredientCount, days):
+    "Write random ingredients, menus and purchases spreadsheets into folder"
+    rand = random.Random(seed)
+    names = sorted(set("%s %s" % (rand.choice(FOODS), i) for i in range(ingredientCount)))
+
+    with open(os.path.join(folder, 'ingredients.csv'), 'wb') as csvFile:
+        writer = csv.writer(csvFile)
+        for name in names:
+            writer.writerow([name, rand.choice(STORES), rand.choice(STORAGE_LOCATIONS),
+                    rand.choice(STORES + ['']), rand.choice(['', 'organic', 'ripe, please'])])
+
+    # The menus have four header rows, just like the real spreadsheet.
+    menuItems = []
+    with open(os.path.join(folder, 'menus.csv'), 'wb') as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(['d', 'Meal', 'Meal Type', 'Dish', 'Ingredients list',
+                'Cooking Notes', 'Quantity / Amount', 'pre-cooked?', 'Buying Notes'])
+        for i in range(3):
+            writer.writerow([''] * 9)
+        for day in range(days):
+            for meal in MEALS:
+                for item in range(rand.randint(1, 6)):
+                    name = rand.choice(names)
+                    menuItems.append((name, day, meal))
+                    writer.writerow([day, meal, rand.choice(['Main', 'Main', 'Snacks']),
+                            'dish', name, rand.choice(['', 'stir']), random_quantity(rand),
+                            '', rand.choice(['', 'ripe'])])
+
+    with open(os.path.join(folder, 'purchases.csv'), 'wb') as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(['Item Requested', 'Count', 'Size', 'Measure In',
+                'Item Bought', 'Shopping Trip', 'Notes', 'Day', 'Meal'])
+        for i in range(len(menuItems) / 4):
+            # Every purchase is of something on the menu. Some say which
+            # meal they're for.
+            name, day, meal = rand.choice(menuItems)
+            if rand.random() > 0.8:
+                day, meal = '', ''
+            writer.writerow([name, rand.randint(1, 4), rand.choice(['', '2', '16', '0.5']),
+                    rand.choice(UNITS + ['lb.', '']), 'bought', 1,
+                    rand.choice(['', 'note']), day, meal])
+
+def random_quantity(rand):
+    "Make up a quantity, in one of the ways people write them"
+    return rand.choice([
+        "%s %s" % (rand.randint(1, 30), rand.choice(UNITS)),
+        "%s/%s %s" % (rand.randint(1, 3), rand.choice([2, 3, 4]), rand.choice(UNITS)),
+        "%s.5 %s" % (rand.randint(0, 5), rand.choice(UNITS)),
+        "~%s %s" % (rand.randint(1, 9), rand.choice(UNITS)),
+        str(rand.randint(1, 12)),
+        'dozen',
+        ''
+    ])
+
+def make_settings(folder):
+    "The planner's spreadsheet settings, pointed at the files in folder"
+    settings = {}
+    for part, partSettings in [('ingredients', INGREDIENTS), ('menus', MENUS),
+            ('purchases', PURCHASES)]:
+        settings[part] = dict(partSettings,
+                file=os.path.join(folder, os.path.basename(partSettings['file'])))
+    return settings
+
+# ===============
+# The engines
+# ===============
+# Each engine builds the report data from the settings, returning the data
+# and how long each part took, in milliseconds.
+
+def timed(timings, name, function, *args, **kwargs):
+    start = time.time()
+    result = function(*args, **kwargs)
+    timings[name] = round((time.time() - start) * 1000, 2)
+    return result
+
+def report_data(model, prefix):
+    data = dict((report, getattr(model, prefix + report)()) for report in REPORTS)
+    for accessor in ACCESSORS:
+        if accessor == 'ingredients_for':
+            data[accessor] = [model.ingredients_for(meal['day'], meal['meal'])
+                    for meal in model.meals()]
+        else:
+            data[accessor] = getattr(model, accessor)()
+    return data
+
+def reference_engine(settings, folder):
+    timings = {}
+    model = timed(timings, 'load_ms', FoodPlannerModel, **settings)
+    data = timed(timings, 'reports_ms', report_data, model, 'compute_')
+    return data, timings
+
+def cached_engine(settings, folder):
+    timings = {}
+    model = timed(timings, 'load_ms', FoodPlannerModel, **settings)
+    timed(timings, 'reports_ms', report_data, model, 'get_')
+    data = timed(timings, 'cached_reports_ms', report_data, model, 'get_')
+    return data, timings
+
+def sqlite_engine(settings, folder):
+    from sqlite_food_planner_model import SQLiteFoodPlannerModel
+    timings = {}
+    model = timed(timings, 'load_ms', SQLiteFoodPlannerModel, **settings)
+    data = timed(timings, 'reports_ms', report_data, model, 'get_')
+    return data, timings
+
+def pipeline_engine(settings, folder):
+    from food_planner_view import FoodPlannerView
+    from planner_pipeline import PlannerPipeline
+    timings = {}
+    model = FoodPlannerModel(load=False, **settings)
+    pipeline = PlannerPipeline(model, FoodPlannerView(model))
+    timed(timings, 'build_ms', pipeline.build, os.path.join(folder, 'pipeline_build'))
+    data = report_data(model, 'get_')
+
+    # The same reports, built the ordinary way, should be the same files.
+    serialModel = FoodPlannerModel(**settings)
+    timed(timings, 'serial_build_ms', FoodPlannerView(serialModel).build,
+            os.path.join(folder, 'serial_build'))
+    return data, timings
+
+def feed_engine(settings, folder):
+    from purchases_feed import PurchasesFeed
+    timings = {}
+    model = timed(timings, 'load_ms', FoodPlannerModel, **settings)
+    timed(timings, 'feed_ms', PurchasesFeed, model)
+    data = timed(timings, 'reports_ms', report_data, model, 'get_')
+    return data, timings
+
+ENGINES = [
+    ('cached', cached_engine),
+    ('sqlite', sqlite_engine),
+    ('pipeline', pipeline_engine),
+    ('feed', feed_engine)
+]
+
+# How to tell whether each engine is faster: the engine and timing it's up
+# against, and its own timing. The pipeline is up against a normal build.
+SPEEDUPS = {
+    "cached": ('reference', 'reports_ms', 'cached_reports_ms'),
+    "sqlite": ('reference', 'reports_ms', 'reports_ms'),
+    "pipeline": ('pipeline', 'serial_build_ms', 'build_ms'),
+    "feed": ('reference', 'reports_ms', 'reports_ms')
+}
+
+# ===============
+# Comparing
+# ===============
+
+def normalize(value):
+    "Make report data comparable: plain dicts and lists, no times, rounded floats"
+    if isinstance(value, dict):
+        return dict((key, normalize(item)) for key, item in value.items()
+                if key != 'time')
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    # Adding the same numbers in a different order can change the last
+    # digit or so.
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+def first_difference(expected, actual, path=''):
+    "Return a description of the first place two structures differ, or None"
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            if not key in actual or not key in expected:
+                return "%s/%s: only in %s" % (path, key,
+                        'reference' if key in expected else 'engine')
+            difference = first_difference(expected[key], actual[key], "%s/%s" % (path, key))
+            if difference:
+                return difference
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        for index, (expectedItem, actualItem) in enumerate(zip(expected, actual)):
+            difference = first_difference(expectedItem, actualItem, "%s[%s]" % (path, index))
+            if difference:
+                return difference
+        if len(expected) != len(actual):
+            return "%s: %s items in the reference, %s in the engine" % (path,
+                    len(expected), len(actual))
+        return None
+    if expected != actual:
+        return "%s: reference has %r, engine has %r" % (path, expected, actual)
+    return None
+
+# Building again with nothing changed shouldn't write a single file, but
+# editing a template has to render its report again. We edit a copy of the
+# templates, so the planner's own are never touched.
+def check_rebuilds(folder, settings, timings):
+    "Return what went wrong building the serial build again"
+    from food_planner_view import FoodPlannerView
+    problems = []
+    buildPath = os.path.join(folder, 'serial_build')
+    shutil.copytree(os.path.join(PLANNER_DIR, 'Templates'), os.path.join(folder, 'Templates'))
+    os.chdir(folder)
+    try:
+        model = FoodPlannerModel(**settings)
+        before = file_times(buildPath)
+        timed(timings, 'rebuild_ms', FoodPlannerView(model).build, buildPath)
+        problems.extend("rebuild: %s was written again with nothing changed" % fileName
+                for fileName, modified in sorted(file_times(buildPath).items())
+                if before.get(fileName) != modified)
+
+        templatePath = os.path.join('Templates', 'BuyList.html')
+        with open(templatePath) as templateFile:
+            template = templateFile.read()
+        with open(templatePath, 'w') as templateFile:
+            templateFile.write(template.replace('{% block content %}',
+                    '{% block content %}<!-- edited -->', 1))
+        FoodPlannerView(model).build(buildPath)
+        with open(os.path.join(buildPath, 'BuyList.html')) as reportFile:
+            if not '<!-- edited -->' in reportFile.read():
+                problems.append("rebuild: BuyList.html wasn't rendered again " +
+                        "after its template changed")
+
+        # planner_cli.py where uses where.json if the manifest says it's
+        # current. Saving a spreadsheet without changing it shouldn't
+        # change that, but really changing it should.
+        fileName = settings['ingredients']['file']
+        with open(fileName, 'rb') as sheetFile:
+            original = sheetFile.read()
+        os.utime(fileName, (time.time() + 10,) * 2)
+        unloaded = FoodPlannerModel(load=False, **settings)
+        if not FoodPlannerView(unloaded).is_current(buildPath, 'where.json'):
+            problems.append("rebuild: where.json was out of date after " +
+                    "saving the ingredients unchanged")
+        with open(fileName, 'wb') as sheetFile:
+            sheetFile.write(original + original.splitlines(True)[-1])
+        if FoodPlannerView(unloaded).is_current(buildPath, 'where.json'):
+            problems.append("rebuild: where.json was still current after " +
+                    "the ingredients changed")
+        with open(fileName, 'wb') as sheetFile:
+            sheetFile.write(original)
+        os.utime(fileName, (time.time() + 20,) * 2)
+    finally:
+        os.chdir(PLANNER_DIR)
+    return problems
+
+# Each change to purchases.csv, and whether the file is finished. Half a
+# row should be left alone until it's finished, so the feed should still
+# agree with the file as it was before.
+def purchase_changes(original, rowsToSkip):
+    "Return a list of (what changed, new contents, finished?) for purchases.csv"
+    lines = original.splitlines(True)
+    header, rows = ''.join(lines[:rowsToSkip]), lines[rowsToSkip:]
+    # Change the first purchase's count without changing the file's
+    # length, so only the contents give the edit away.
+    cells = next(csv.reader([rows[0]]))
+    cells[1] = cells[1][:-1] + ('3' if cells[1].endswith('2') else '2')
+    edited = StringIO.StringIO()
+    csv.writer(edited).writerow(cells)
+    appended = original + rows[1] + rows[0]
+    changed = header + edited.getvalue() + ''.join(rows[1:]) + rows[1] + rows[0]
+    firstHalf, secondHalf = rows[1][:rows[1].index(',') + 1], rows[1][rows[1].index(',') + 1:]
+    return [
+        ('appending rows', appended, True),
+        ('editing an earlier row', changed, True),
+        ('starting a row', changed + firstHalf, False),
+        ('finishing the row', changed + firstHalf + secondHalf, True),
+        ('deleting a row', header + ''.join(rows[2:]) + rows[1] + rows[0] + rows[1], True)
+    ]
+
+def check_feed_updates(settings, timings):
+    "Return where a PurchasesFeed stops agreeing with a fresh model as purchases change"
+    from purchases_feed import PurchasesFeed
+    problems = []
+    fileName = settings['purchases']['file']
+    with open(fileName, 'rb') as purchasesFile:
+        original = purchasesFile.read()
+    changes = purchase_changes(original, settings['purchases']['rowsToSkip'])
+
+    model = FoodPlannerModel(**settings)
+    feed = PurchasesFeed(model)
+    expected = normalize(report_data(model, 'compute_'))
+    timings['feed_updates_ms'] = 0
+    for step, (description, contents, finished) in enumerate(changes):
+        with open(fileName, 'wb') as purchasesFile:
+            purchasesFile.write(contents)
+        # SheetReader keeps rows until the file's modification time
+        # changes, and we write faster than the clock ticks.
+        os.utime(fileName, (time.time() + step + 1,) * 2)
+        start = time.time()
+        try:
+            feed.update()
+        except Exception as error:
+            problems.append("feed after %s: %s: %s" % (description,
+                    type(error).__name__, error))
+            break
+        timings['feed_updates_ms'] += round((time.time() - start) * 1000, 2)
+        if finished:
+            expected = normalize(report_data(FoodPlannerModel(**settings), 'compute_'))
+        actual = normalize(report_data(model, 'get_'))
+        for report in REPORTS + ACCESSORS:
+            difference = first_difference(expected[report], actual[report])
+            if difference:
+                problems.append("feed after %s: %s %s" % (description, report, difference))
+
+    with open(fileName, 'wb') as purchasesFile:
+        purchasesFile.write(original)
+    os.utime(fileName, (time.time() + len(changes) + 1,) * 2)
+    return problems
+
+def file_times(folder):
+    return dict((fileName, os.path.getmtime(os.path.join(folder, fileName)))
+            for fileName in os.listdir(folder))
+
+def compare_builds(folder):
+    "Return the files which differ between the pipeline and serial builds"
+    comparison = filecmp.dircmp(os.path.join(folder, 'serial_build'),
+            os.path.join(folder, 'pipeline_build'))
+    return sorted(comparison.diff_files + comparison.left_only + comparison.right_only)
+
+# ===============
+# Running
+# ===============
+
+def check_dataset(seed, ingredientCount, days, engines):
+    "Compare every engine against the reference on one set of spreadsheets"
+    folder = tempfile.mkdtemp(prefix='planner-differential-')
+    write_spreadsheets(folder, seed, ingredientCount, days)
+    settings = make_settings(folder)
+
+    expected, referenceTimings = reference_engine(settings, folder)
+    expected = normalize(expected)
+    result = {'seed': seed, 'folder': folder, 'timings': {'reference': referenceTimings},
+            'differences': []}
+    for name, engine in ENGINES:
+        if engines and not name in engines:
+            continue
+        actual, timings = engine(settings, folder)
+        result['timings'][name] = timings
+        actual = normalize(actual)
+        for report in REPORTS + ACCESSORS:
+            difference = first_difference(expected[report], actual[report])
+            if difference:
+                result['differences'].append("%s %s %s" % (name, report, difference))
+        if name == 'pipeline':
+            for fileName in compare_builds(folder):
+                result['differences'].append("pipeline build: %s differs" % fileName)
+            result['differences'].extend(check_rebuilds(folder, settings, timings))
+        if name == 'feed':
+            result['differences'].extend(check_feed_updates(settings, timings))
+    return result
+
+def speedups(results):
+    "How many times faster each engine was than what it's up against, on average"
+    totals = {}
+    for result in results:
+        timings = result['timings']
+        for name in timings:
+            if name in SPEEDUPS:
+                baseline, baselineKey, key = SPEEDUPS[name]
+                totals.setdefault(name, []).append(
+                        timings[baseline][baselineKey] / max(timings[name][key], 0.01))
+    return dict((name, round(sum(ratios) / len(ratios), 1)) for name, ratios in totals.items())
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every way of " +
+            "building the reports agrees with the reference model")
+    parser.add_argument('--runs', '-n', type=int, default=5,
+            help="How many random sets of spreadsheets to try")
+    parser.add_argument('--seed', '-s', type=int, default=None,
+            help="The seed for the first set of spreadsheets (random if not given)")
+    parser.add_argument('--ingredients', '-i', type=int, default=60,
+            help="How many ingredients to make up")
+    parser.add_argument('--days', '-d', type=int, default=12,
+            help="How many days of menus to make up")
+    parser.add_argument('--engine', '-e', action='append', default=[],
+            help="Only check this engine (%s); can be given more than once" %
+            ', '.join(name for name, engine in ENGINES))
+    parser.add_argument('--json', default=False, action="store_true",
+            help="Print the results as JSON")
+    args = parser.parse_args()
+
+    # The view finds its templates relative to the planner's folder.
+    os.chdir(PLANNER_DIR)
+    firstSeed = args.seed if args.seed is not None else random.randint(0, 10 ** 6)
+    results = []
+    for run in range(args.runs):
+        result = check_dataset(firstSeed + run, args.ingredients, args.days, args.engine)
+        # Keep the spreadsheets only if something went wrong with them
+        if not any(result['differences']):
+            shutil.rmtree(result['folder'])
+            del result['folder']
+        results.append(result)
+
+    failures = [r for r in results if any(r['differences'])]
+    if args.json:
+        print json.dumps({'results': results, 'speedups': speedups(results)},
+                indent=2, sort_keys=True)
+    else:
+        for result in results:
+            print "seed %s: %s" % (result['seed'], "DIFFERENT, spreadsheets kept in " +
+                    result['folder'] if result['differences'] else "all engines agree")
+            for difference in result['differences'][:10]:
+                print "    " + difference
+            for name, timings in sorted(result['timings'].items()):
+                print "    %-10s %s" % (name, ', '.join("%s=%s" % item
+                        for item in sorted(timings.items())))
+        print "Speedup: %s" % ', '.join("%s %sx" % item
+                for item in sorted(speedups(results).items()))
+    if any(failures):
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
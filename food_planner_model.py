@@ -1,11 +1,10 @@
 # Import the other libraries we need.
-import csv
 import re
 import os
-import inspect
-import time
-from pprint import pprint as p
+import threading
 from datetime import datetime
+from frozen_dict import freeze
+from sheet_reader import SheetReader
 
 STORAGE_LOCATIONS = [
     'cooler',
@@ -23,32 +22,119 @@ class FoodPlannerModel(object):
     # The initialization function. By the end of __init__, the 
     # model should be ready to be used by a view
     def __init__(self, ingredients=None, menus=None, purchases=None, 
-            verbose=False, strict=False, warnings=False):
+            verbose=False, strict=False, warnings=False, load=True,
+            nutrition=None):
         self.verbose = verbose
         self.strict = strict
         self.showWarnings = warnings or verbose
         self.settings = {
             "ingredients"   : ingredients,
             "menus"         : menus,
-            "purchases"     : purchases
+            "purchases"     : purchases,
+            "nutrition"     : nutrition
         }
         self.storageLocations = STORAGE_LOCATIONS
-
+        # When a PurchasesFeed is keeping running totals of what's been 
+        # bought, it puts them here. See get_quantity_purchased.
+        self.purchaseTotals = None
+        # Every time the ingredients, menu items or purchases change, their
+        # version goes up by one. Cached report data remembers the versions
+        # it was made from, so we can tell when it's out of date.
+        self.versions = {
+            "ingredients"   : 0,
+            "menuItems"     : 0,
+            "purchases"     : 0,
+            "nutrition"     : 0
+        }
+        self.reportCache = {}
+        self.reportCacheLock = threading.RLock()
+        # Pass load=False if you want to load the spreadsheets yourself, one
+        # at a time (PlannerPipeline does this). Ingredients come first, since
+        # menu items and purchases both look up their ingredients.
+        if load:
+            self.load()
+
+    # Read and validate all the spreadsheets. Subclasses which keep their
+    # data somewhere other than in lists (like SQLiteFoodPlannerModel) 
+    # override the load_ methods.
+    def load(self):
+        "Generate the ingredients, menu items, purchases and nutrition"
+        self.load_ingredients()
+        self.load_menu_items()
+        self.load_purchases()
+        self.load_nutrition()
+
+    def load_ingredients(self):
         self.ingredients = self.generate_ingredients()
+        self.changed('ingredients')
+
+    def load_menu_items(self):
         self.menuItems = self.generate_menu_items()
+        self.changed('menuItems')
+
+    def load_purchases(self):
         self.purchases = self.generate_purchases()
+        self.changed('purchases')
+
+    def load_nutrition(self):
+        self.nutrition = self.generate_nutrition()
+        self.changed('nutrition')
+
+    # ===============
+    # Report cache
+    # ===============
+
+    # Building a report's data means looking through everything, so once 
+    # we've built it, we keep it until the data it was built from changes.
+    # Anything that changes the ingredients, menu items or purchases has to 
+    # call changed(); the load_ methods and add_purchases/clear_purchases 
+    # already do. If you change the lists by hand, call changed() yourself.
+    def changed(self, part):
+        "Note that part of the model has changed, so reports built from it are stale"
+        with self.reportCacheLock:
+            self.versions[part] += 1
+
+    # The cached data is frozen, so reports can't change it out from under 
+    # each other. The lock means that if two threads ask for the same report
+    # at once, it only gets built once.
+    def cached_report(self, name, compute,
+            inputs=('ingredients', 'menuItems', 'purchases')):
+        "Return frozen data from compute(), reusing it until its inputs change"
+        with self.reportCacheLock:
+            stamp = tuple(self.versions[i] for i in inputs)
+            cached = self.reportCache.get(name)
+            if cached is None or cached[0] != stamp:
+                self.log("Building report data for %s" % name)
+                cached = (stamp, freeze(compute()))
+                self.reportCache[name] = cached
+            return cached[1]
 
     def get_buy_list(self):
+        "Return the data for a buy list"
+        return self.cached_report('buyList', self.compute_buy_list)
+
+    def get_final_buy_list(self):
+        "Return the data for a final buy list"
+        return self.cached_report('finalBuyList', self.compute_final_buy_list)
+
+    def get_pack_list(self):
+        "Return the data for a pack list"
+        return self.cached_report('packList', self.compute_pack_list)
+
+    def get_cook_list(self):
+        "Return the data for a cook list"
+        return self.cached_report('cookList', self.compute_cook_list)
+
+    def compute_buy_list(self):
         "Generate the data for a buy list"
         records = []
         # Get a list of all unique combinations of name and unit
-        for record in self.purchases + self.menuItems:
-            if not any([r for r in records if r['name'] == record['name'] and r['unit'] == record['unit']]):
-                records.append({
-                    'name': record.get('name', record.get('item')),
-                    'unit': record['unit'],
-                    'store': self.get_ingredient_store(record['name'])
-                })
+        for record in self.first_records(['purchases', 'menuItems']):
+            records.append({
+                'name': record.get('name', record.get('item')),
+                'unit': record['unit'],
+                'store': self.get_ingredient_store(record['name'])
+            })
 
         stores = []
         for store in self.store_names():
@@ -75,24 +161,23 @@ class FoodPlannerModel(object):
         return {"stores": stores, "time": NOW}
 
 
-    def get_final_buy_list(self):
+    def compute_final_buy_list(self):
         records = []
         # Get a list of all unique combinations of name and unit
-        for record in self.purchases + self.menuItems:
-            if not any([r for r in records if r['name'] == record['name'] and r['unit'] == record['unit']]):
-                name = record.get('name', record.get('item'))
-                required = self.get_quantity_required(record['name'], record['unit'])
-                purchased = self.get_quantity_purchased(record['name'], record['unit'])
-                
-                records.append({
-                    'name': name,
-                    'unit': record['unit'],
-                    'store': self.get_ingredient_store(record['name']),
-                    'quantityRequired': required,
-                    'quantityPurchased': purchased,
-                    'quantityStillNeeded': required - purchased,
-                    'notes': '; '.join(self.get_notes(name, menu_cook=False))
-                })
+        for record in self.first_records(['purchases', 'menuItems']):
+            name = record.get('name', record.get('item'))
+            required = self.get_quantity_required(record['name'], record['unit'])
+            purchased = self.get_quantity_purchased(record['name'], record['unit'])
+
+            records.append({
+                'name': name,
+                'unit': record['unit'],
+                'store': self.get_ingredient_store(record['name']),
+                'quantityRequired': required,
+                'quantityPurchased': purchased,
+                'quantityStillNeeded': required - purchased,
+                'notes': '; '.join(self.get_notes(name, menu_cook=False))
+            })
         return {"records": records, "time": NOW}
 
         stores = []
@@ -121,19 +206,18 @@ class FoodPlannerModel(object):
         
 
             
-    def get_pack_list(self):
+    def compute_pack_list(self):
         records = []
         # Get a list of all unique combinations of name and unit
-        for record in self.menuItems + self.purchases:
-            if not any([r for r in records if r['name'] == record['name'] and r['unit'] == record['unit']]):
-                records.append({
-                    'name': record['name'],
-                    'unit': record['unit'],
-                    'quantity': self.get_quantity_required(record['name'], record['unit']),
-                    'container': self.get_storage_container(record),
-                    'buyStore': self.get_ingredient(record['name'])['buyStore'],
-                    'notes': '; '.join(self.get_notes(record['name'], menu_cook=False))
-                })
+        for record in self.first_records(['menuItems', 'purchases']):
+            records.append({
+                'name': record['name'],
+                'unit': record['unit'],
+                'quantity': self.get_quantity_required(record['name'], record['unit']),
+                'container': self.get_storage_container(record),
+                'buyStore': self.get_ingredient(record['name'])['buyStore'],
+                'notes': '; '.join(self.get_notes(record['name'], menu_cook=False))
+            })
         records = sorted(records, key=lambda r: r['name'])
 
         containerList = list(set([i['container'] for i in records]))
@@ -147,6 +231,21 @@ class FoodPlannerModel(object):
             })
         return {"containers": sorted(containers, key=lambda i: i['name']), "time": NOW}
 
+    # The buy and pack lists have one line for each different name and unit.
+    # Each line starts from the first menu item or purchase with that name
+    # and unit, looking in parts in order.
+    def first_records(self, parts):
+        "Return the first record for each name and unit in parts, in order"
+        records = []
+        seen = set()
+        for part in parts:
+            for record in getattr(self, part):
+                key = (record['name'], record['unit'])
+                if not key in seen:
+                    seen.add(key)
+                    records.append(record)
+        return records
+
     def get_menu_item(self, purchase):
         "Find a matching menu item for a purchase"
         for menuItem in self.menuItems:
@@ -156,7 +255,7 @@ class FoodPlannerModel(object):
                 return menuItem
         self.warn_or_crash("Can't find a menu item matching purchase %s" % purchase)
 
-    def get_cook_list(self):
+    def compute_cook_list(self):
         cookList = []
         mealNames = {
             '1B': 'Breakfast',
@@ -164,7 +263,9 @@ class FoodPlannerModel(object):
             '3D': 'Dinner'
         }
         for meal in self.meals():
-            ingredients = self.ingredients_for(meal['day'], meal['meal'])
+            # Work with copies, so we don't write notes and containers into
+            # the menu items themselves.
+            ingredients = [dict(i) for i in self.ingredients_for(meal['day'], meal['meal'])]
             for ingredient in ingredients:
                 ingredient['notes'] = '; '.join(self.get_notes(ingredient['name']))
                 ingredient['container'] = self.get_storage_container(ingredient)
@@ -203,12 +304,24 @@ class FoodPlannerModel(object):
     def generate_ingredients(self):
         self.log("GENERATING INGREDIENTS")
 
-        # We'll start with the raw data.
-        ingredients = self.read_file(self.settings['ingredients'])
-    
-        # We're going to need a list to keep track of the valid 
-        # ingredients, and another to keep track of any errors.
-        result = []
+        # We'll start with the raw data, and clean it up one row at a time.
+        result = list(self.clean_ingredients(
+                self.read_file(self.settings['ingredients'])))
+        self.check_ingredient_names([i['name'] for i in result])
+
+        # If we weren't strict, or there weren't any errors, we succeeded, so 
+        # we can return result, which is the list of valid ingredients. Just for
+        # fun, we'll sort them in alphabetical order.
+        #return sorted(result, key='name')
+        return result
+
+    # clean_ingredients is a generator: instead of building up a list and 
+    # returning it, it yields each valid ingredient as soon as it's ready. 
+    # That way, whoever calls it decides where the ingredients go.
+    def clean_ingredients(self, ingredients):
+        "Yield each valid ingredient from a list of raw rows"
+
+        # We're going to need a list to keep track of any errors.
         errors = []
 
         # We list the required properties for each ingredient.
@@ -244,7 +357,7 @@ class FoodPlannerModel(object):
                 self.warn_or_crash("Ingredient %s has an invalid storage location: %s" %
                         (eachIngredient['name'], eachIngredient['storage']))
 
-            result.append(eachIngredient)
+            yield eachIngredient
 
             # NOTE: Changed the flow here--no longer checking for required
             # properties. Instead, we're going to just go with it.
@@ -268,7 +381,8 @@ class FoodPlannerModel(object):
             else:
                 self.warn(error)
 
-        ingredientNames = [i['name'] for i in result]
+    def check_ingredient_names(self, ingredientNames):
+        "Report similar and duplicate ingredient names"
         similarNames = self.check_for_similar_strings(ingredientNames)
         if any(similarNames):
             errorList =  ["Found similar ingredient names:"]
@@ -284,21 +398,27 @@ class FoodPlannerModel(object):
                 errorList.append("  * %s" % dup)
             self.warn_or_crash('\n'.join(errorList))
 
-        # If we weren't strict, or there weren't any errors, we succeeded, so 
-        # we can return result, which is the list of valid ingredients. Just for
-        # fun, we'll sort them in alphabetical order.
-        #return sorted(result, key='name')
-        return result
-
     # Generate the menu items. This will follow much the same pattern as
     # generate_ingredients. 
     def generate_menu_items(self):
         self.log("GENERATING MENU ITEMS")
 
-        # Get the raw data, and create lists for the result and the errors
-        menuItems = self.read_file(self.settings['menus'])
-        result = []
+        # Get the raw data, and clean it up one row at a time. Errors get
+        # collected in a list as we go.
         errors = []
+        result = list(self.clean_menu_items(
+                self.read_file(self.settings['menus']), errors))
+        self.report_menu_item_errors(errors)
+
+        # If we weren't strict, or there weren't any errors, we succeeded, so 
+        # we can return result, which is the list of valid menu items.
+        return result
+
+    # Like clean_ingredients, this is a generator. Instead of complaining 
+    # about invalid menu items right away, it appends them to errors so that
+    # they can all be reported together once every row has been seen.
+    def clean_menu_items(self, menuItems, errors):
+        "Yield each valid menu item from a list of raw rows"
 
         # We'll define a list of properties we require for each menu item
         requiredProperties = [
@@ -350,8 +470,8 @@ class FoodPlannerModel(object):
                     # 'unit'
                     eachMenuItem.update(parsedQuantity)
 
-                    # And add this menu item to the list of good ones
-                    result.append(eachMenuItem)
+                    # And hand this menu item over to whoever wants it
+                    yield eachMenuItem
 
                 else:
                     errors.append("Skipping invalid menu item '%s': there is no ingredient named %s" % 
@@ -360,6 +480,8 @@ class FoodPlannerModel(object):
                 errors.append("Skipping invalid menu item %s: missing properties: %s" % 
                         (eachMenuItem['item'], eachMenuItem))
 
+    def report_menu_item_errors(self, errors):
+        "Crash or warn about invalid menu items, depending on strictness"
         # If we're in strict mode, things should fail if there are errors.
         # In this case, we'll raise a ValueError, and give it an explanation
         # of what went wrong. We use '\n'.join(errors) to convert the list
@@ -371,13 +493,56 @@ class FoodPlannerModel(object):
             else: 
                 self.warn(error)
 
-        # If we weren't strict, or there weren't any errors, we succeeded, so 
-        # we can return result, which is the list of valid menu items.
-        return result
-
     def generate_purchases(self):
-        purchases = self.read_file(self.settings['purchases'])
-        goodPurchases = []
+        return list(self.clean_purchases(
+                self.read_file(self.settings['purchases'])))
+
+    # These two let a PurchasesFeed keep the purchases up to date as new 
+    # rows show up in purchases.csv, without regenerating everything.
+    def add_purchases(self, purchases):
+        "Add some already-cleaned purchases"
+        self.purchases.extend(purchases)
+        self.changed('purchases')
+
+    def clear_purchases(self):
+        "Forget all the purchases"
+        self.purchases = []
+        self.changed('purchases')
+
+    # The nutrition table is optional: without one, or without the file,
+    # there's just no nutrition information.
+    def generate_nutrition(self):
+        settings = self.settings['nutrition']
+        if not settings or not os.path.exists(SheetReader().find_file(settings['file'])):
+            self.log("No nutrition table to read")
+            return []
+        return list(self.clean_nutrition(self.read_file(settings)))
+
+    # Each row is matched to menu items by the ingredient's exact name,
+    # just as the menus spreadsheet spells it ("Box of cookies", not "box
+    # of cookies").
+    def clean_nutrition(self, rows):
+        "Yield each valid row of the nutrition table"
+        numbers = ['calories', 'protein', 'pounds']
+        for row in rows:
+            self.strip_strings_in_dict(row)
+            if self.is_empty(row) or not row['name']:
+                continue
+            row['unit'] = row['unit'] or 'count'
+            try:
+                for field in numbers:
+                    row[field] = float(row[field]) if row[field] else None
+            except ValueError:
+                self.warn_or_crash("Skipping nutrition for %s: %s isn't a number" %
+                        (row['name'], row[field]))
+                continue
+            if self.get_ingredient(row['name']):
+                yield row
+            else:
+                self.warn_or_crash("Skipping nutrition: there is no ingredient named %s" % row['name'])
+
+    def clean_purchases(self, purchases):
+        "Yield each valid purchase from a list of raw rows"
         for purchase in purchases:
             if not purchase['unit']:
                 purchase['unit'] = 'count'
@@ -388,40 +553,28 @@ class FoodPlannerModel(object):
             purchase['unitsPerCount'] = float(purchase['unitsPerCount'])
             purchase['unit'] = purchase['unit'].strip().strip('.')
             if self.get_ingredient(purchase['name']):
-                goodPurchases.append(purchase)
+                yield purchase
             else:
                 self.warn_or_crash("Skipping invalid purchase: there is no ingredient named %s" % purchase['name'])
-        return goodPurchases
 
 
     # ===============
     # Helpers
     # ===============
 
-    # We use read_file to read each of the three csv files 
+    # We use read_file to read each of the three spreadsheets. SheetReader
+    # does the actual reading, so they can be CSV, XLSX or ODS files.
     def read_file(self, fileSettings):
-        "Read in a csv file and return a list of the data it contains"
+        "Read in a spreadsheet and return a list of the data it contains"
 
         # Let 'em know what's going on.
         self.log("Attempting to read in %s, skipping the first %s rows" % 
                 (fileSettings['file'], fileSettings['rowsToSkip']))
 
-        # We create a csv reader which will return a dict for each row it reads
-        with open(fileSettings['file']) as csvFile:
-            reader = csv.DictReader(csvFile, fileSettings['fieldNames'])
-
-            # The reader has a 'cursor' pointing to the place in the file it's 
-            # currently reading from. Every time we call read, it moves the cursor 
-            # forward. (You could call reader.rewind() if you wanted). But we want
-            # to skip some number of rows, so we'll call reader.next() without 
-            # capturing the data some number of times.
-            for eachRowToSkip in range(fileSettings['rowsToSkip']):
-                self.log("Skipping header row: %s" % reader.next())
-
-            # Now we'll convert the rest of the rows available into a list, so 
-            # we can let the reader release the file and still have a copy of
-            # the data. We'll return that list.
-            return [row for row in reader]
+        # The reader skips the header rows for us (and uses them to find 
+        # each column, if the settings list the headers). We get back a list
+        # with a dict for each of the rest of the rows.
+        return SheetReader().read(fileSettings)
 
     def has_properties(self, dictToTest, properties):
         "Check whether a dict has certain properties defined"
@@ -508,19 +661,26 @@ class FoodPlannerModel(object):
         "Return a list of ingredient names"
         return sorted([i['name'] for i in self.ingredients])
 
+    # Each (name, unit) total starts out as a copy of the first menu item
+    # using that ingredient with that unit. An ingredient listed twice in
+    # the ingredients spreadsheet still only gets one total per unit.
     def menu_item_totals(self):
         "Return a list of menu items, where items of the same name are joined"
         itemTotals = []
+        seenNames = set()
         for eachIngredient in self.ingredients:
+            if eachIngredient['name'] in seenNames:
+                continue
+            seenNames.add(eachIngredient['name'])
             ingredientUses = [i for i in self.menuItems if i['name'] == eachIngredient['name']]
-            ingredientUnits = list(set([i['unit'] for i in ingredientUses]))
+            ingredientUnits = sorted(set([i['unit'] for i in ingredientUses]))
             for ingredientUnit in ingredientUnits:
                 ingredientUsesWithUnit = [i for i in ingredientUses if i['unit'] == ingredientUnit]
                 if any(ingredientUsesWithUnit):
                     totalQuantity = sum([i['quantity'] for i in ingredientUsesWithUnit])
                     buyNotes = filter(lambda i: i, [i['notes'] for i in ingredientUsesWithUnit])
                     buyNotes.append(eachIngredient['notes'])
-                    ingredientTotal = ingredientUses[0]
+                    ingredientTotal = dict(ingredientUsesWithUnit[0])
                     ingredientTotal.update({
                         'quantity': totalQuantity,
                         'buyNotes': '; '.join(buyNotes)
@@ -632,6 +792,8 @@ class FoodPlannerModel(object):
                 "NO STORAGE LOCATION")
 
     def get_quantity_purchased(self, itemName, unit):
+        if self.purchaseTotals is not None:
+            return self.purchaseTotals.get((itemName, unit), 0)
         quantityPurchased = 0
         for purchase in self.purchases:
             if purchase['name'] == itemName and purchase['unit'] == unit:
@@ -698,11 +860,7 @@ class FoodPlannerModel(object):
         storage = ingredient['storage']
         hasMeal = item['meal'] not in [None, ''] and item['day'] not in [None, '']
         if hasMeal:
-            if item['meal'] in ['1B', '2L']:
-                bagNumber = max(int(item['day'] or 0) - 1, 0)
-            else:
-                bagNumber = int(item['day'])
-            containerNumber = (bagNumber / 5) + 1
+            bagNumber, containerNumber = self.get_bag_number(item)
 
         # There are some special meal types
         mealType = (self.get_menu_item(item) or {}).get('mealType')
@@ -740,5 +898,15 @@ class FoodPlannerModel(object):
                 return "Not assigned to a meal--Reserve cooler (keep frozen at bottom)"
                 
 
+    # Breakfast and lunch come out of the previous night's bag, and each
+    # cooler or drybox holds five days' worth of bags.
+    def get_bag_number(self, item):
+        "Return the bag and container numbers for a menu item with a meal"
+        if item['meal'] in ['1B', '2L']:
+            bagNumber = max(int(item['day'] or 0) - 1, 0)
+        else:
+            bagNumber = int(item['day'])
+        return bagNumber, (bagNumber / 5) + 1
+
     def get_time(self):
         return {'time': NOW}
@@ -1,68 +1,272 @@
-from jinja2 import Environment, FileSystemLoader
-import shutil
+import glob
+import hashlib
+import json
 import os
-import inspect
-# A little trick. Now I can call p(valueIwantToPrint) and see it nicely
-from pprint import pprint as p
-env = Environment(loader=FileSystemLoader('Templates'))
 
+from consumption_timeline import ConsumptionTimeline
+from ingredient_consistency import IngredientConsistency
+from nutrition_rollup import NutritionRollup
+from search_index import SearchIndex
+from sheet_reader import SheetReader
+
+# Each part of the model, and the settings for the spreadsheet it comes from
+MODEL_PARTS = {
+    "ingredients": "ingredients",
+    "menuItems": "menus",
+    "purchases": "purchases",
+    "nutrition": "nutrition"
+}
+
+MANIFEST = 'manifest.json'
+
+# jinja2 takes a while to import, and setting up an Environment takes a 
+# while too, so we don't do either until somebody actually renders a 
+# template. After that, we keep the same Environment around.
+_environment = None
+
+def get_environment():
+    "Return the jinja2 Environment for our templates, creating it if needed"
+    global _environment
+    if _environment is None:
+        from jinja2 import Environment, FileSystemLoader
+        _environment = Environment(loader=FileSystemLoader('Templates'))
+    return _environment
+
+# Every build used to start by deleting everything, and every report said
+# when it was generated, so every file changed every time. That makes it
+# hard to tell what really changed, and anything that copies _build
+# somewhere else (rsync, a phone) has to copy everything.
+#
+# So now the build keeps a manifest: for each report, a hash (a
+# fingerprint) of everything it's made from--the spreadsheets it reads,
+# its templates, and the planner's code--and a hash of what it wrote. If
+# none of that has changed, and the file is still there as we left it, we
+# don't even render the report. If something did change, we render it, but
+# only write the file if the new version is different, so an unchanged
+# report keeps its bytes and its modification time. The time a report was
+# generated only goes at the bottom if you ask for it (build --timestamp).
 class FoodPlannerView(object):
 
-    def __init__(self, model):
+    # Each report is a file name, the name of the method which renders it,
+    # and the parts of the model it reads. PlannerPipeline uses the last part
+    # to start each report as soon as its data is ready.
+    reports = [
+        ("BuyList.html", "generate_buy_list",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("BuyListFinal.html", "generate_final_buy_list",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("PackList.html", "generate_pack_list",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("CookList.html", "generate_cook_list",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("WhereIsIt.html", "generate_where_is_it",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("where.json", "generate_search_index_json",
+                ['ingredients', 'menuItems', 'purchases']),
+        ("IngredientConflicts.html", "generate_ingredient_conflicts",
+                ['ingredients', 'purchases']),
+        ("Timeline.html", "generate_timeline",
+                ['ingredients', 'menuItems']),
+        ("Nutrition.html", "generate_nutrition",
+                ['ingredients', 'menuItems', 'nutrition']),
+        ("index.html", "generate_index", [])
+    ]
+
+    def __init__(self, model, timestamp=False):
         self.model = model
+        self.timestamp = timestamp
 
     def build(self, buildPath):
-        if os.path.isdir(buildPath):
-            shutil.rmtree(buildPath)
-        os.mkdir(buildPath)
-        self.generate_final_document(
-            os.path.join(buildPath, "BuyList.html"), 
-            self.generate_buy_list()
-        )
-        self.generate_final_document(
-            os.path.join(buildPath, "BuyListFinal.html"), 
-            self.generate_final_buy_list()
-        )
-        self.generate_final_document(
-            os.path.join(buildPath, "PackList.html"), 
-            self.generate_pack_list()
-        )
-        self.generate_final_document(
-            os.path.join(buildPath, "CookList.html"), 
-            self.generate_cook_list()
-        )
-        self.generate_final_document(
-            os.path.join(buildPath, "index.html"), 
-            self.generate_index()
-        )
+        self.prepare(buildPath)
+        for fileName, methodName, inputs in self.reports:
+            self.build_report(buildPath, fileName, methodName)
+        self.finish(buildPath)
+
+    def prepare(self, buildPath):
+        "Make the build directory, and read what we built there last time"
+        if not os.path.isdir(buildPath):
+            os.mkdir(buildPath)
+        self.oldManifest = self.read_manifest(buildPath)
+        self.manifest = {}
+        self.fileHashes = {}
+
+    # PlannerPipeline calls this from several threads, but never two at
+    # once, so we don't need a lock around the manifest.
+    def build_report(self, buildPath, fileName, methodName):
+        "Render one report and write it into the build directory, if it changed"
+        path = os.path.join(buildPath, fileName)
+        sources = self.sources(fileName)
+        old = self.oldManifest.get(fileName)
+        if (not self.timestamp and old and old['sources'] == sources and
+                os.path.exists(path) and self.hash_file(path) == old['output']):
+            self.manifest[fileName] = old
+            return
+        output = getattr(self, methodName)()
+        if isinstance(output, unicode):
+            output = output.encode('utf-8')
+        outputHash = self.hash(output)
+        if not os.path.exists(path) or self.hash_file(path) != outputHash:
+            self.generate_final_document(path, output)
+        self.manifest[fileName] = {'sources': sources, 'output': outputHash}
+
+    # planner_cli.py where searches where.json instead of loading the
+    # model, as long as the manifest says it was made from the spreadsheets
+    # as they are now. Saving a spreadsheet without changing it, or
+    # changing a spreadsheet where.json doesn't read, doesn't count.
+    def is_current(self, buildPath, fileName):
+        "Check whether a report in the build directory is up to date"
+        self.fileHashes = {}
+        old = self.read_manifest(buildPath).get(fileName)
+        path = os.path.join(buildPath, fileName)
+        return bool(old and old['sources'] == self.sources(fileName) and
+                os.path.exists(path) and self.hash_file(path) == old['output'])
+
+    def finish(self, buildPath):
+        "Remove reports we don't make anymore, and save the manifest"
+        for fileName in self.oldManifest:
+            path = os.path.join(buildPath, fileName)
+            if not fileName in self.manifest and os.path.exists(path):
+                os.remove(path)
+        manifest = json.dumps(self.manifest, indent=2, sort_keys=True)
+        path = os.path.join(buildPath, MANIFEST)
+        if not os.path.exists(path) or self.hash_file(path) != self.hash(manifest):
+            self.generate_final_document(path, manifest)
 
     def generate_buy_list(self):
-        template = env.get_template('BuyList.html')
+        template = get_environment().get_template('BuyList.html')
         data = self.model.get_buy_list()
-        return template.render(data)
+        return self.render(template, data)
 
     def generate_final_buy_list(self):
-        template = env.get_template('BuyListFinal.html')
+        template = get_environment().get_template('BuyListFinal.html')
         data = self.model.get_final_buy_list()
-        return template.render(data)
+        return self.render(template, data)
 
     def generate_pack_list(self):
-        template = env.get_template('PackList.html')
+        template = get_environment().get_template('PackList.html')
         data = self.model.get_pack_list()
-        return template.render(data)
+        return self.render(template, data)
 
     def generate_cook_list(self):
-        template = env.get_template('CookList.html')
+        template = get_environment().get_template('CookList.html')
         data = self.model.get_cook_list()
-        return template.render(data)
+        return self.render(template, data)
+
+    def generate_where_is_it(self):
+        template = get_environment().get_template('WhereIsIt.html')
+        data = {'indexJson': self.get_search_index().to_page_json()}
+        return self.render(template, data)
+
+    # planner_cli.py's where subcommand reads this instead of the
+    # spreadsheets, as long as it's newer than they are.
+    def generate_search_index_json(self):
+        return self.get_search_index().to_json()
+
+    def get_search_index(self):
+        "Return a SearchIndex of the model, building it once per change"
+        return self.model.cached_report('searchIndex',
+                lambda: SearchIndex.from_model(self.model))
+
+    def generate_ingredient_conflicts(self):
+        template = get_environment().get_template('IngredientConflicts.html')
+        data = self.model.cached_report('ingredientConflicts',
+                lambda: IngredientConsistency.from_model(self.model).check(),
+                inputs=('ingredients', 'purchases'))
+        return self.render(template, data)
+
+    def generate_timeline(self):
+        template = get_environment().get_template('Timeline.html')
+        data = self.model.cached_report('timeline',
+                lambda: ConsumptionTimeline(self.model).compute(),
+                inputs=('ingredients', 'menuItems'))
+        return self.render(template, data)
+
+    def generate_nutrition(self):
+        template = get_environment().get_template('Nutrition.html')
+        data = self.model.cached_report('nutrition',
+                lambda: NutritionRollup(self.model).compute(),
+                inputs=('ingredients', 'menuItems', 'nutrition'))
+        return self.render(template, data)
 
     def generate_index(self):
-        template = env.get_template('index.html')
-        data = self.model.get_time()
-        return template.render(data)
+        template = get_environment().get_template('index.html')
+        return self.render(template, {})
+
+    def render(self, template, data):
+        "Render a template, saying when it was generated only if we were asked to"
+        time = self.model.get_time()['time'] if self.timestamp else None
+        return template.render(dict(data, time=time))
 
-        
     def generate_final_document(self, whereToBuild, whatToBuildWith):
         with open(whereToBuild, "w") as buildFile:
             buildFile.write(whatToBuildWith)
+
+    # ===============
+    # Manifest
+    # ===============
+
+    def sources(self, fileName):
+        "Return the hashes of everything a report is made from"
+        inputs = dict((f, i) for f, m, i in self.reports)[fileName]
+        sources = {'timestamp': self.timestamp, 'code': self.code_hash(), 'inputs': {}}
+        # Changing the settings (say, which column is which) changes what
+        # we read from a spreadsheet, so they count as part of it. The
+        # nutrition table is optional, so it might have no settings or no
+        # file.
+        for part in inputs:
+            settings = self.model.settings[MODEL_PARTS[part]]
+            if not settings:
+                sources['inputs'][part] = None
+                continue
+            sheetFile = SheetReader().find_file(settings['file'])
+            fileHash = self.hash_file(sheetFile) if os.path.exists(sheetFile) else ''
+            sources['inputs'][part] = self.hash(fileHash +
+                    json.dumps(settings, sort_keys=True))
+        if fileName.endswith('.html'):
+            sources['templates'] = self.template_hashes(fileName)
+        return sources
+
+    def template_hashes(self, templateName):
+        "Hash a template and every template it extends or includes"
+        from jinja2 import meta
+        environment = get_environment()
+        hashes = {}
+        toHash = [templateName]
+        while any(toHash):
+            name = toHash.pop()
+            if name in hashes:
+                continue
+            source = environment.loader.get_source(environment, name)[0]
+            hashes[name] = self.hash(source.encode('utf-8'))
+            toHash.extend(n for n in meta.find_referenced_templates(
+                    environment.parse(source)) if n)
+        return hashes
+
+    # Any change to the planner's code could change any report, so we hash
+    # all of it together.
+    def code_hash(self):
+        if not 'code' in self.fileHashes:
+            codeFiles = sorted(glob.glob(os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), '*.py')))
+            self.fileHashes['code'] = self.hash(''.join(self.hash_file(f)
+                    for f in codeFiles))
+        return self.fileHashes['code']
+
+    def read_manifest(self, buildPath):
+        try:
+            with open(os.path.join(buildPath, MANIFEST)) as manifestFile:
+                return json.load(manifestFile)
+        except (IOError, ValueError):
+            return {}
+
+    def hash_file(self, path):
+        "Hash a file's contents, remembering the hash for the rest of the build"
+        path = os.path.abspath(path)
+        if not path in self.fileHashes:
+            with open(path, 'rb') as hashFile:
+                self.fileHashes[path] = self.hash(hashFile.read())
+        return self.fileHashes[path]
+
+    def hash(self, data):
+        return hashlib.sha1(data).hexdigest()
    
@@ -0,0 +1,34 @@
+# The model caches the data for each report, and hands the same data to
+# everyone who asks for it. If one report changed that data (say, by adding
+# a 'container' to each ingredient), the next report to ask would get the
+# changed version. So before caching anything, we freeze it: dicts become
+# FrozenDicts, and lists become tuples, all the way down. Reading frozen data
+# works just the same--templates and json.dumps can't tell the difference--
+# but changing it raises a TypeError.
+class FrozenDict(dict):
+    "A dict which can't be changed after it's created"
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("This data is shared, so it can't be changed. " +
+                "Make a copy with dict() first.")
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    # A plain dict would be rebuilt one item at a time when unpickled or
+    # copied, which our methods don't allow, so we rebuild it all at once.
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+def freeze(value):
+    "Return a frozen copy of a structure made of dicts and lists"
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.iteritems())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
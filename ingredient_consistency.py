@@ -0,0 +1,136 @@
+import re
+
+# The ingredient properties which should be the same everywhere an
+# ingredient is listed, and what to call them in the report
+FIELDS = [
+    ('buyStore', 'Store'),
+    ('buyStoreAlternate', 'Alternate store'),
+    ('storage', 'Storage')
+]
+
+# IngredientConsistency finds ingredients which are listed more than once
+# with different stores or storage locations. The buy list only ever uses
+# the first row it finds for an ingredient, so the rest are quietly ignored.
+#
+# The same ingredient isn't always spelled the same way: "Tomatoes, canned"
+# and "canned tomato" are one thing. So before comparing, we boil each name
+# down to a key: its words, lowercased, with plurals trimmed off, in
+# alphabetical order. Both of those become "canned tomato". Rows with the
+# same key are grouped together, and each group is checked for conflicts.
+# Since the groups are a dict from key to rows, this takes one pass over
+# the ingredients and purchases, however many there are.
+#
+# Purchases don't have stores or storage, but a purchase whose name is
+# spelled differently from its ingredient won't be counted toward it, so
+# we list those too. The model skips those purchases when it loads them,
+# so we read the names straight from the purchases spreadsheet.
+class IngredientConsistency(object):
+    "Find ingredients listed with conflicting stores or storage"
+
+    def __init__(self, ingredients, purchaseNames):
+        self.ingredients = ingredients
+        self.purchaseNames = purchaseNames
+
+    @classmethod
+    def from_model(cls, model):
+        # The model lowercases purchase names, so we do too.
+        purchaseNames = [row['name'].strip().lower() for row in
+                model.read_file(model.settings['purchases']) if row['name']]
+        return cls(model.ingredients, purchaseNames)
+
+    def check(self):
+        "Return the data for a report of each group of names with a problem"
+        groups = {}
+        for ingredient in self.ingredients:
+            group = self.group_for(groups, ingredient['name'])
+            group['rows'].append(ingredient)
+        for name in self.purchaseNames:
+            group = self.group_for(groups, name)
+            if not name in group['purchaseNames']:
+                group['purchaseNames'].append(name)
+
+        problems = []
+        for key in sorted(groups):
+            group = groups[key]
+            if not any(group['rows']):
+                # A purchase with no ingredient at all is a different
+                # problem, which planner_cli.py check already finds.
+                continue
+            names = self.unique([row['name'] for row in group['rows']])
+            conflicts = [c for c in (self.conflict(group['rows'], field, label)
+                    for field, label in FIELDS) if c]
+            purchaseVariants = [n for n in group['purchaseNames'] if not n in names]
+            if any(conflicts) or any(purchaseVariants):
+                problems.append({
+                    'key': key,
+                    'names': names,
+                    'conflicts': conflicts,
+                    'purchaseVariants': purchaseVariants
+                })
+        return {
+            'groups': problems,
+            'ingredientCount': len(self.ingredients),
+            'groupCount': len(groups)
+        }
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def group_for(self, groups, name):
+        return groups.setdefault(self.normalize(name),
+                {'rows': [], 'purchaseNames': []})
+
+    def conflict(self, rows, field, label):
+        "Describe the different values of field in a group, or None if they agree"
+        values = []
+        rowsByValue = {}
+        firstValues = {}
+        for row in rows:
+            value = row[field]
+            if not value in rowsByValue:
+                values.append(value)
+                rowsByValue[value] = []
+            rowsByValue[value].append(row['name'])
+            firstValues.setdefault(row['name'], value)
+        if len(values) < 2:
+            return None
+        return {
+            'field': field,
+            'label': label,
+            'options': [{
+                'value': value,
+                'names': self.unique(rowsByValue[value]),
+                # The rows the buy list never looks at, because an earlier
+                # row for the same name said something else
+                'ignoredNames': self.unique([n for n in rowsByValue[value]
+                        if firstValues[n] != value])
+            } for value in values]
+        }
+
+    def normalize(self, name):
+        "Boil an ingredient name down to a key shared by its other spellings"
+        words = re.findall(r"[a-z0-9]+", (name or '').lower())
+        return ' '.join(sorted(set(self.stem(word) for word in words)))
+
+    def stem(self, word):
+        "Trim the plural off a word: tomatoes to tomato, berries to berry"
+        if len(word) <= 3 or word.endswith('ss'):
+            return word
+        if word.endswith('ies'):
+            return word[:-3] + 'y'
+        if word.endswith(('oes', 'ches', 'shes', 'xes')):
+            return word[:-2]
+        if word.endswith('s'):
+            return word[:-1]
+        return word
+
+    def unique(self, items):
+        "Return items without repeats, in the order they first appear"
+        seen = set()
+        result = []
+        for item in items:
+            if not item in seen:
+                seen.add(item)
+                result.append(item)
+        return result
@@ -0,0 +1,160 @@
+import json
+import os
+
+# tracemalloc keeps track of every block of memory Python allocates, and
+# which line of code allocated it. It comes with Python 3.4 and later; on
+# Python 2 it's only there if you've installed pytracemalloc. Without it,
+# we fall back to asking the operating system how big the process is (its
+# resident set size, or RSS), which is much coarser but better than nothing.
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# A MemoryProfiler runs the planner one stage at a time (reading each
+# spreadsheet, building each report) and measures the memory each stage
+# uses:
+#   retained: how much more memory is in use after the stage than before,
+#             which is what the stage leaves behind for later stages
+#   peak:     the most memory in use at any moment during the stage,
+#             compared to before it started
+# With tracemalloc, we also record the lines of code which allocated the
+# most memory during each stage.
+#
+# Use it like this:
+#   profiler = MemoryProfiler()
+#   profiler.start()
+#   profiler.run_stage('load_ingredients', model.load_ingredients)
+#   ...
+#   profiler.stop()
+#   print profiler.report_text()
+class MemoryProfiler(object):
+    "Measure how much memory each stage of building the planner uses"
+
+    def __init__(self, top=5, useTracemalloc=True):
+        self.top = top
+        self.useTracemalloc = useTracemalloc and tracemalloc is not None
+        self.stages = []
+        self.metrics = {}
+
+    def start(self):
+        if self.useTracemalloc:
+            # Keep enough of each traceback to see past our helper methods
+            tracemalloc.start(5)
+
+    def stop(self):
+        if self.useTracemalloc:
+            tracemalloc.stop()
+
+    def run_stage(self, name, function, *args):
+        "Call function(*args), measuring its memory, and return its result"
+        if self.useTracemalloc:
+            before = tracemalloc.take_snapshot()
+            currentBefore = tracemalloc.get_traced_memory()[0]
+            # Python 3.9 can reset the peak, so we get each stage's own peak.
+            # Before that, the peak is the highest since start().
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            result = function(*args)
+            currentAfter, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            # Leave out what tracemalloc allocated to keep track of things
+            ignoreTracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            before = before.filter_traces(ignoreTracemalloc)
+            after = after.filter_traces(ignoreTracemalloc)
+            sites = [{
+                'site': "%s:%s" % (stat.traceback[0].filename, stat.traceback[0].lineno),
+                'bytes': stat.size_diff,
+                'blocks': stat.count_diff
+            } for stat in after.compare_to(before, 'lineno')[:self.top]]
+        else:
+            currentBefore = self.rss()
+            recordBefore = self.max_rss()
+            result = function(*args)
+            currentAfter = peak = self.rss()
+            sites = []
+            # The operating system only tells us the highest the process
+            # has ever been, so if this stage set a new record, that's its
+            # peak. Otherwise, the best we know is how big it is now.
+            if self.max_rss() > recordBefore:
+                peak = max(peak, self.max_rss())
+        self.stages.append({
+            'stage': name,
+            'retained_bytes': currentAfter - currentBefore,
+            'peak_bytes': peak - currentBefore,
+            'top_sites': sites
+        })
+        return result
+
+    def add_metric(self, name, value):
+        "Record a number that isn't about a single stage"
+        self.metrics[name] = value
+
+    def retained_by(self, stageNames):
+        "Add up the memory retained by some stages"
+        return sum(s['retained_bytes'] for s in self.stages if s['stage'] in stageNames)
+
+    # ===============
+    # Reporting
+    # ===============
+
+    def report(self):
+        "Return everything we measured as a dict"
+        return {
+            'method': 'tracemalloc' if self.useTracemalloc else 'rss',
+            'stages': self.stages,
+            'metrics': self.metrics
+        }
+
+    def report_json(self):
+        return json.dumps(self.report(), indent=2, sort_keys=True)
+
+    def report_text(self):
+        lines = ["Memory profile (measured with %s)" % self.report()['method'],
+                "%-28s %12s %12s" % ('stage', 'retained', 'peak')]
+        for stage in self.stages:
+            lines.append("%-28s %12s %12s" % (stage['stage'],
+                    self.format_bytes(stage['retained_bytes']),
+                    self.format_bytes(stage['peak_bytes'])))
+            for site in stage['top_sites']:
+                lines.append("    %10s  %s" % (self.format_bytes(site['bytes']),
+                        site['site']))
+        for name, value in sorted(self.metrics.items()):
+            lines.append("%s: %s" % (name, value))
+        return '\n'.join(lines)
+
+    def format_bytes(self, size):
+        for unit in ['B', 'KB', 'MB']:
+            if abs(size) < 1024:
+                return "%.1f %s" % (size, unit) if unit != 'B' else "%d B" % size
+            size /= 1024.0
+        return "%.1f GB" % size
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def rss(self):
+        "How much memory the process is using right now, in bytes"
+        # On Linux, /proc/self/statm lists the process size in pages; the
+        # second number is the resident set size.
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (IOError, OSError, ValueError):
+            return self.max_rss()
+
+    def max_rss(self):
+        "The most memory the process has ever used, in bytes"
+        if resource is None:
+            return 0
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, and Macs report bytes.
+        if os.uname()[0] == 'Darwin':
+            return maxRss
+        return maxRss * 1024
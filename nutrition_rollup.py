@@ -0,0 +1,128 @@
+import re
+
+from consumption_timeline import POUNDS_PER_UNIT, MEAL_NAMES
+
+# A NutritionRollup adds up the calories and protein in the menu: for each
+# meal, for each day, and for each person, flagging the days that come in
+# under the minimum. The menu's quantities are for the whole group, so
+# each person's share is the total divided by the number of people.
+#
+# Each menu item is matched to the nutrition table by its ingredient and
+# unit ("3 cups rice" needs a row for rice in cups). If there's no row for
+# the unit, but the item is measured by weight and the ingredient has a row
+# that says how many pounds it weighs, we work it out by weight instead.
+# Menu items we can't match are listed, so we know which rows to add.
+#
+# Like ConsumptionTimeline, we give each meal a place in a row of numbers
+# and drop every menu item into its meal's place, in one pass over the
+# menu items. Days are then just sums over their meals. Nothing looks
+# through the menu again for each meal or day, so it's quick enough to run
+# every time the menu is saved (see planner_cli.py nutrition --watch).
+class NutritionRollup(object):
+    "Add up the calories and protein per meal, per day and per person"
+
+    def __init__(self, model):
+        self.model = model
+        settings = model.settings.get('nutrition') or {}
+        self.people = settings.get('people', 1)
+        self.minimumCalories = settings.get('minimumCalories')
+
+    def compute(self):
+        "Return the data for a nutrition report"
+        schedule = self.model.meals()
+        mealIndex = dict(((m['day'], m['meal']), i) for i, m in enumerate(schedule))
+        byUnit, byWeight = self.lookup_tables()
+        hasTable = bool(self.model.nutrition)
+
+        calories = [0.0] * len(schedule)
+        protein = [0.0] * len(schedule)
+        unknown = [0] * len(schedule)
+        missing = {}
+        for item in self.model.menuItems:
+            index = mealIndex.get((item['day'], item['meal']))
+            if index is None:
+                continue
+            nutrients = self.nutrients(item, byUnit, byWeight)
+            if nutrients is None:
+                unknown[index] += 1
+                key = (item['name'], item['unit'])
+                missing.setdefault(key, {'name': item['name'], 'unit': item['unit'],
+                        'uses': 0})['uses'] += 1
+                continue
+            calories[index] += nutrients[0]
+            protein[index] += nutrients[1]
+
+        days = []
+        for index, meal in enumerate(schedule):
+            if not days or days[-1]['day'] != meal['day']:
+                days.append({'day': meal['day'], 'meals': []})
+            days[-1]['meals'].append(dict(self.totals(calories[index],
+                    protein[index], unknown[index]),
+                    name=MEAL_NAMES.get(meal['meal'], meal['meal'])))
+        for day in days:
+            meals = day['meals']
+            day.update(self.totals(sum(m['calories'] for m in meals),
+                    sum(m['protein'] for m in meals),
+                    sum(m['unknownCount'] for m in meals)))
+            # Without a nutrition table, every day would look empty
+            day['low'] = bool(hasTable and self.minimumCalories and
+                    day['caloriesPerPerson'] < self.minimumCalories)
+
+        return {
+            'people': self.people,
+            'minimumCalories': self.minimumCalories,
+            'hasTable': hasTable,
+            'days': days,
+            'lowDays': [day['day'] for day in days if day['low']],
+            'caloriesPerPersonPerDay': (sum(d['caloriesPerPerson'] for d in days) /
+                    len(days) if days else 0.0),
+            'missing': sorted(missing.values(),
+                    key=lambda m: (-m['uses'], m['name'], m['unit']))
+        }
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def lookup_tables(self):
+        "Index the nutrition table by ingredient and unit, and by ingredient for weights"
+        byUnit = {}
+        byWeight = {}
+        for row in self.model.nutrition:
+            if row['calories'] is None:
+                continue
+            key = (row['name'], self.unit_key(row['unit']))
+            byUnit.setdefault(key, row)
+            if row['pounds'] and not row['name'] in byWeight:
+                byWeight[row['name']] = (row['calories'] / row['pounds'],
+                        (row['protein'] or 0.0) / row['pounds'])
+        return byUnit, byWeight
+
+    def nutrients(self, item, byUnit, byWeight):
+        "Return the calories and protein in a menu item, or None if we can't tell"
+        unit = self.unit_key(item['unit'])
+        row = byUnit.get((item['name'], unit))
+        if row is not None:
+            return (item['quantity'] * row['calories'],
+                    item['quantity'] * (row['protein'] or 0.0))
+        if unit in POUNDS_PER_UNIT and item['name'] in byWeight:
+            pounds = item['quantity'] * POUNDS_PER_UNIT[unit]
+            perPound = byWeight[item['name']]
+            return (pounds * perPound[0], pounds * perPound[1])
+        return None
+
+    def totals(self, calories, protein, unknownCount):
+        return {
+            'calories': calories,
+            'protein': protein,
+            'caloriesPerPerson': calories / self.people,
+            'proteinPerPerson': protein / self.people,
+            'unknownCount': unknownCount
+        }
+
+    def unit_key(self, unit):
+        "Boil a unit down so that 'Cups', 'cup' and 'cups.' all match"
+        unit = re.sub(r"[^a-z]", '', (unit or '').lower())
+        if len(unit) > 2 and unit.endswith('s') and not unit.endswith('ss'):
+            unit = unit[:-1]
+        return unit or 'count'
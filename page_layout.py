@@ -0,0 +1,127 @@
+import textwrap
+
+from pdf_writer import PdfWriter
+
+# A PageLayout arranges blocks of rows onto fixed-size pages. A block is
+# something like one container on the pack list, or one meal on the cook
+# list: a title, and a list of rows, each row a list of cells. We try hard
+# to keep each block on one page, since it's annoying to find half of a
+# meal's ingredients on the back of the page. So if a block doesn't fit in
+# the space left on a page, it starts a new page. Only a block too long for
+# any page gets split, and then its title is repeated with "(continued)".
+#
+# Text doesn't know how wide it is, so we guess: in Helvetica, characters
+# average about half as wide as they are tall. Long cells wrap onto extra
+# lines within their column.
+class PageLayout(object):
+    "Lay out titled blocks of rows onto fixed-size pages"
+
+    def __init__(self, title, columns, width=612, height=792, margin=36,
+            fontSize=9, titleSize=11):
+        # columns is a list of fractions of the page width, one per cell
+        self.title = title
+        self.writer = PdfWriter(width, height)
+        self.margin = margin
+        self.fontSize = fontSize
+        self.titleSize = titleSize
+        self.leading = fontSize * 1.25
+        usableWidth = width - 2 * margin
+        self.columnX = []
+        self.columnChars = []
+        x = margin
+        for fraction in columns:
+            columnWidth = usableWidth * fraction
+            self.columnX.append(x)
+            # Leave a little room between columns
+            self.columnChars.append(max(int((columnWidth - 6) / (fontSize * 0.5)), 1))
+            x += columnWidth
+        # The page title sits at the top, and the page number at the bottom.
+        self.top = height - margin - titleSize * 2
+        self.bottom = margin + fontSize * 2
+        self.blockTitleHeight = titleSize * 1.8
+        self.blockGap = fontSize
+
+    def layout(self, blocks):
+        "Arrange blocks onto pages, returning each page's drawing commands"
+        self.pages = []
+        self.start_page()
+        pageHeight = self.top - self.bottom
+        for block in blocks:
+            rows = [self.wrap_row(row) for row in block['rows']]
+            rowHeights = [len(max(row, key=len)) * self.leading for row in rows]
+            blockHeight = self.blockTitleHeight + sum(rowHeights)
+            # Start a new page if this block doesn't fit here, but would fit
+            # on a page of its own--or if there isn't even room here for its
+            # title and first row.
+            spaceLeft = self.y - self.bottom
+            firstRowHeight = self.blockTitleHeight + sum(rowHeights[:1])
+            if self.y < self.top and (firstRowHeight > spaceLeft or
+                    (blockHeight > spaceLeft and blockHeight <= pageHeight)):
+                self.start_page()
+            self.add_block_title(block['title'])
+            for row, rowHeight in zip(rows, rowHeights):
+                if rowHeight > self.y - self.bottom and self.y < self.top - self.blockTitleHeight:
+                    self.start_page()
+                    self.add_block_title(block['title'] + ' (continued)')
+                self.add_row(row, rowHeight)
+            self.y -= self.blockGap
+        self.finish_page()
+        return self.pages
+
+    def write(self, blocks, fileName):
+        "Lay out blocks and write them to a PDF, returning each page's contents"
+        pages = self.layout(blocks)
+        self.writer.pages = list(pages)
+        self.writer.write(fileName)
+        return pages
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def start_page(self):
+        if hasattr(self, 'commands'):
+            self.finish_page()
+        self.commands = [self.writer.text(self.margin, self.top + self.titleSize,
+                self.title, size=self.titleSize + 3, style='bold')]
+        self.y = self.top
+
+    def finish_page(self):
+        pageNumber = len(self.pages) + 1
+        self.commands.append(self.writer.text(self.margin, self.margin,
+                "%s - page %s" % (self.title, pageNumber), size=self.fontSize - 1))
+        self.pages.append(''.join(self.commands))
+        del self.commands
+
+    def add_block_title(self, title):
+        self.y -= self.titleSize * 1.3
+        self.commands.append(self.writer.text(self.margin, self.y, title,
+                size=self.titleSize, style='bold'))
+        lineY = self.y - self.titleSize * 0.3
+        self.commands.append(self.writer.line(self.margin, lineY,
+                self.writer.width - self.margin, lineY))
+        self.y -= self.blockTitleHeight - self.titleSize * 1.3
+
+    def add_row(self, row, rowHeight):
+        for x, lines in zip(self.columnX, row):
+            lineY = self.y - self.fontSize
+            for line in lines:
+                # A row taller than a whole page gets cut off at the bottom.
+                if lineY < self.bottom:
+                    break
+                self.commands.append(self.writer.text(x, lineY, line,
+                        size=self.fontSize))
+                lineY -= self.leading
+        self.y -= rowHeight
+
+    def wrap_row(self, row):
+        "Wrap each cell in a row to its column, returning a list of lines per cell"
+        return [textwrap.wrap(self.to_text(cell), chars) or ['']
+                for cell, chars in zip(row, self.columnChars)]
+
+    def to_text(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            return "%g" % value
+        return str(value)
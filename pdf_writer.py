@@ -0,0 +1,105 @@
+import zlib
+
+# The two fonts every PDF reader has built in, so we never have to embed one
+FONTS = {
+    "regular": ('F1', 'Helvetica'),
+    "bold": ('F2', 'Helvetica-Bold')
+}
+
+# A PdfWriter writes a PDF file without any help from a browser or a PDF
+# library. A PDF is mostly plain text: a list of numbered objects (the
+# catalog, the list of pages, the fonts, and each page with its contents),
+# followed by a table of where each object starts in the file. Each page's
+# contents are a little program of drawing commands, like
+#   BT /F1 9 Tf 36 700 Td (2 lb almonds) Tj ET
+# which means "begin text, use font F1 at 9 points, move to (36, 700), show
+# this string, end text". Positions are in points (1/72 inch) from the
+# bottom left corner of the page.
+#
+# Nothing in the file depends on the time or on chance, so the same pages
+# always give exactly the same bytes.
+class PdfWriter(object):
+    "Write pages of text and lines to a PDF file"
+
+    def __init__(self, width=612, height=792):
+        # US Letter, unless we're told otherwise
+        self.width = width
+        self.height = height
+        self.pages = []
+
+    def add_page(self, content):
+        "Add a page, given its drawing commands as a string"
+        self.pages.append(content)
+
+    def write(self, fileName):
+        with open(fileName, 'wb') as pdfFile:
+            pdfFile.write(self.render())
+
+    def render(self):
+        "Return the whole PDF file as a string"
+        objects = []
+        pageCount = len(self.pages)
+        # Objects 1 and 2 are the catalog and the page list, and the fonts
+        # come next. After that, each page takes two objects: the page
+        # itself, then its contents.
+        firstPage = 3 + len(FONTS)
+        pageNumbers = [firstPage + 2 * i for i in range(pageCount)]
+        objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+        objects.append("<< /Type /Pages /Kids [%s] /Count %s >>" % (
+                ' '.join("%s 0 R" % n for n in pageNumbers), pageCount))
+        fontResources = []
+        for index, style in enumerate(sorted(FONTS)):
+            fontName, baseFont = FONTS[style]
+            objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /%s " % baseFont +
+                    "/Encoding /WinAnsiEncoding >>")
+            fontResources.append("/%s %s 0 R" % (fontName, 3 + index))
+        for pageNumber, content in zip(pageNumbers, self.pages):
+            objects.append("<< /Type /Page /Parent 2 0 R " +
+                    "/MediaBox [0 0 %s %s] " % (self.width, self.height) +
+                    "/Resources << /Font << %s >> >> " % ' '.join(fontResources) +
+                    "/Contents %s 0 R >>" % (pageNumber + 1))
+            compressed = zlib.compress(content, 6)
+            objects.append("<< /Length %s /Filter /FlateDecode >>\nstream\n" %
+                    len(compressed) + compressed + "\nendstream")
+
+        # Write out each object, remembering where it started
+        output = ["%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"]
+        offsets = []
+        position = len(output[0])
+        for number, body in enumerate(objects):
+            chunk = "%s 0 obj\n%s\nendobj\n" % (number + 1, body)
+            offsets.append(position)
+            output.append(chunk)
+            position += len(chunk)
+
+        # The cross-reference table lists where each object starts. Every
+        # line has to be exactly 20 bytes long.
+        output.append("xref\n0 %s\n0000000000 65535 f \n" % (len(objects) + 1))
+        output.extend("%010d 00000 n \n" % offset for offset in offsets)
+        output.append("trailer\n<< /Size %s /Root 1 0 R >>\nstartxref\n%s\n%%%%EOF\n" %
+                (len(objects) + 1, position))
+        return ''.join(output)
+
+    # ===============
+    # Drawing commands
+    # ===============
+    # These return strings of drawing commands, which get joined together
+    # into a page's contents.
+
+    def text(self, x, y, string, size=9, style='regular'):
+        "Return the commands to draw a string with its baseline at (x, y)"
+        return "BT /%s %s Tf %.2f %.2f Td (%s) Tj ET\n" % (FONTS[style][0],
+                size, x, y, self.escape(string))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        "Return the commands to draw a line from (x1, y1) to (x2, y2)"
+        return "%s w %.2f %.2f m %.2f %.2f l S\n" % (width, x1, y1, x2, y2)
+
+    def escape(self, string):
+        "Prepare a string to go inside parentheses in a PDF"
+        # The spreadsheets are UTF-8, but the built-in fonts only know the
+        # characters in the Windows-1252 encoding.
+        if not isinstance(string, unicode):
+            string = str(string).decode('utf-8', 'replace')
+        string = string.encode('cp1252', 'replace')
+        return string.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
@@ -0,0 +1,341 @@
+#! /usr/bin/python
+# planner_cli.py does everything planner.py does, split up into subcommands:
+#
+#   ./planner_cli.py build      render the reports into _build
+#   ./planner_cli.py reload     download the spreadsheets from Google Docs
+#   ./planner_cli.py check      read the spreadsheets and report problems
+#   ./planner_cli.py export     write the report data out as JSON
+#   ./planner_cli.py pdf        write the pack and cook lists as PDFs
+#   ./planner_cli.py where      find where an ingredient is packed
+#   ./planner_cli.py nutrition  add up the calories per person per day
+#
+# To use it from anywhere, install it with `pip install -e .` (see
+# setup.py). That gives you a food-planner command, so you can type
+# `food-planner check` instead of `./planner_cli.py check`.
+#
+# Importing a module takes time, and some of ours are slow: requests takes
+# tens of milliseconds to import, and so does jinja2. So at the top of this
+# file we only import what every subcommand needs, and each subcommand
+# imports the rest of what it needs when it runs. A check never has to wait
+# for jinja2 or requests at all. See benchmark.py for how long each
+# subcommand takes to start.
+import argparse
+import os
+import sys
+
+from planner_settings import (INGREDIENTS, MENUS, PURCHASES, NUTRITION,
+        BUILD_TARGET, PRINT_TARGET)
+
+# We look for the spreadsheets and templates next to this file, so the
+# planner works no matter which folder you run it from.
+PLANNER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def make_model(args, load=True):
+    "Create the kind of model the arguments ask for"
+    settings = dict(ingredients=INGREDIENTS, menus=MENUS, purchases=PURCHASES,
+            warnings=args.warnings, verbose=args.verbose, strict=args.strict,
+            load=load, nutrition=NUTRITION)
+    if getattr(args, 'database', None):
+        from sqlite_food_planner_model import SQLiteFoodPlannerModel
+        return SQLiteFoodPlannerModel(database=args.database, **settings)
+    else:
+        from food_planner_model import FoodPlannerModel
+        return FoodPlannerModel(**settings)
+
+# The settings might say menus.csv when there's only a menus.xlsx, so we
+# ask SheetReader which file we'd really read.
+def spreadsheet_time(settings):
+    "When a spreadsheet was last saved, or None if it isn't there"
+    from sheet_reader import SheetReader
+    fileName = SheetReader().find_file(settings['file'])
+    return os.path.getmtime(fileName) if os.path.exists(fileName) else None
+
+def reload(args):
+    "Download the spreadsheets from Google Docs"
+    from spreadsheet_loader import SpreadsheetLoader
+    SpreadsheetLoader(verbose=True).load([INGREDIENTS, MENUS, PURCHASES])
+
+def build(args):
+    "Render all the reports"
+    from food_planner_view import FoodPlannerView
+
+    if args.memory_profile:
+        return profile_memory(args)
+
+    # With --pipeline, we hand everything over to a PlannerPipeline, which
+    # downloads, reads and renders all at once instead of one step at a time.
+    if args.pipeline:
+        from planner_pipeline import PlannerPipeline
+        loader = None
+        if args.reload:
+            from spreadsheet_loader import SpreadsheetLoader
+            loader = SpreadsheetLoader(verbose=True)
+        model = make_model(args, load=False)
+        pipeline = PlannerPipeline(model,
+                FoodPlannerView(model, timestamp=args.timestamp),
+                loader=loader, verbose=args.verbose)
+        pipeline.build(args.output)
+        return
+
+    if args.reload:
+        reload(args)
+    model = make_model(args)
+    FoodPlannerView(model, timestamp=args.timestamp).build(args.output)
+
+def pdf(args):
+    "Write the pack and cook lists as PDFs for printing"
+    from print_view import PrintView
+    model = make_model(args)
+    changes = PrintView(model).build(args.output)
+    for name, changedPages in sorted(changes.items()):
+        if any(changedPages):
+            print "%s: pages %s changed" % (name, ', '.join(str(p) for p in changedPages))
+        else:
+            print "%s: no pages changed" % name
+
+# Build one stage at a time, measuring how much memory each stage takes.
+# The report data is built before rendering, so we can see how much each
+# report needs on its own.
+def profile_memory(args):
+    "Build the reports, reporting the memory used by each stage"
+    from memory_profiler import MemoryProfiler
+    from food_planner_view import FoodPlannerView
+    profiler = MemoryProfiler()
+    profiler.start()
+    if args.reload:
+        profiler.run_stage('reload', reload, args)
+    model = profiler.run_stage('create model', make_model, args, False)
+    loadStages = ['load_ingredients', 'load_menu_items', 'load_purchases',
+            'load_nutrition']
+    for stage in loadStages:
+        profiler.run_stage(stage, getattr(model, stage))
+    for report in sorted(EXPORTS.values()):
+        profiler.run_stage(report, getattr(model, report))
+    profiler.run_stage('render', FoodPlannerView(model).build, args.output)
+    profiler.stop()
+
+    # How much memory the model takes for each row of the menus. If this
+    # grows, something started keeping more than it needs to.
+    menuRows = len(model.menuItems)
+    profiler.add_metric('menu_rows', menuRows)
+    profiler.add_metric('bytes_per_menu_row',
+            profiler.retained_by(loadStages) / max(menuRows, 1))
+
+    if args.memory_profile == 'json':
+        print profiler.report_json()
+    else:
+        print profiler.report_text()
+
+# Reading the spreadsheets and building the model is the slow part of a
+# lookup, so if the last build saved a search index, and the manifest says
+# the spreadsheets it was made from haven't changed since, we use that
+# instead. Comparing hashes rather than times means just saving a
+# spreadsheet, or changing only the nutrition table, doesn't count.
+def where(args):
+    "Find which containers and meals an ingredient is packed for"
+    import time
+    from food_planner_view import FoodPlannerView
+    from search_index import SearchIndex
+    indexFile = os.path.join(BUILD_TARGET, 'where.json')
+    if FoodPlannerView(make_model(args, load=False)).is_current(BUILD_TARGET,
+            'where.json'):
+        with open(indexFile) as jsonFile:
+            index = SearchIndex.from_json(jsonFile.read())
+    else:
+        index = SearchIndex.from_model(make_model(args))
+    started = time.time()
+    results = index.search(' '.join(args.query), limit=args.limit)
+    elapsed = time.time() - started
+    for entry in results:
+        print "%s (%s, from %s)" % (entry['name'], entry['storage'], entry['buyStore'])
+        for place in entry['places']:
+            print "    %-24s %-20s %s" % (place['container'], place['meal'],
+                    place['quantity'])
+    if not any(results):
+        print "Nothing matches '%s'" % ' '.join(args.query)
+    if args.verbose:
+        print "Searched in %.3f ms" % (elapsed * 1000)
+
+# With --watch, we keep the model around and check every so often whether
+# a spreadsheet has been saved. If it has, we reload just that part of the
+# model and add everything up again, so you can see each day's calories
+# change as you edit the menu.
+def nutrition(args):
+    "Add up the calories and protein per person for each day"
+    import time
+    from nutrition_rollup import NutritionRollup
+    model = make_model(args)
+    print_nutrition(NutritionRollup(model).compute(), args.limit)
+    if not args.watch:
+        return
+
+    # Menu items and nutrition both look up their ingredients, so when the
+    # ingredients change, we reload everything.
+    watched = [(INGREDIENTS, model.load), (MENUS, model.load_menu_items),
+            (NUTRITION, model.load_nutrition)]
+    modified = [spreadsheet_time(settings) for settings, load in watched]
+    print "Watching for changes (Ctrl-C to stop)..."
+    try:
+        while True:
+            time.sleep(args.interval)
+            times = [spreadsheet_time(settings) for settings, load in watched]
+            changed = [load for (settings, load), old, new in
+                    zip(watched, modified, times) if old != new]
+            if not any(changed):
+                continue
+            modified = times
+            # A spreadsheet caught halfway through being saved might not
+            # make sense, but it will once it's saved, so just say so.
+            try:
+                for load in [model.load] if model.load in changed else changed:
+                    load()
+            except (ValueError, IOError) as error:
+                print "Can't read the spreadsheets yet: %s" % error
+                continue
+            print "\n--- %s ---" % time.strftime('%I:%M:%S %p')
+            print_nutrition(NutritionRollup(model).compute(), args.limit)
+    except KeyboardInterrupt:
+        pass
+
+def print_nutrition(data, limit):
+    if not data['hasTable']:
+        print "There's no nutrition table (%s), so there's nothing to add up." % NUTRITION['file']
+        return
+    print "Per person, for %s people:" % data['people']
+    print "    %-8s %9s %12s %10s" % ('', 'Calories', 'Protein (g)', 'Unknown')
+    for day in data['days']:
+        print "    %-8s %9.0f %12.0f %10s %s" % ('Day %s' % day['day'],
+                day['caloriesPerPerson'], day['proteinPerPerson'],
+                day['unknownCount'] or '', 'LOW' if day['low'] else '')
+    print "Average: %.0f calories per person per day" % data['caloriesPerPersonPerDay']
+    if any(data['missing']):
+        print "No nutrition for %s of the menu's ingredients and units, including:" % len(data['missing'])
+        for item in data['missing'][:limit]:
+            print "    %s (%s), %s times" % (item['name'], item['unit'], item['uses'])
+
+def check(args):
+    "Check the spreadsheets for problems, without building the model"
+    from spreadsheet_checker import SpreadsheetChecker
+    checker = SpreadsheetChecker(ingredients=INGREDIENTS, menus=MENUS,
+            purchases=PURCHASES)
+    checker.check()
+    if args.json:
+        print checker.report_json()
+    elif any(checker.problems):
+        print checker.report_text()
+    # Exit with an error if there were any errors, so this can be used to 
+    # check the spreadsheets every time they're saved.
+    if checker.has_errors():
+        return 1
+
+# The reports are just templates filled in with data from the model. Export
+# skips the templates and writes the data itself, which is handy for feeding
+# to other programs.
+EXPORTS = {
+    "buy": "get_buy_list",
+    "final": "get_final_buy_list",
+    "pack": "get_pack_list",
+    "cook": "get_cook_list"
+}
+
+def export(args):
+    "Write the data behind the reports as JSON"
+    import json
+    reports = args.report or sorted(EXPORTS.keys())
+    unknownReports = [r for r in reports if not r in EXPORTS]
+    if any(unknownReports):
+        raise ValueError("Unknown reports: %s" % ', '.join(unknownReports))
+    model = make_model(args)
+    data = dict((report, getattr(model, EXPORTS[report])()) for report in reports)
+    output = json.dumps(data, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            outputFile.write(output)
+    else:
+        print output
+
+def make_parser():
+    "Define the subcommands and their arguments"
+    parser = argparse.ArgumentParser(description='''
+        Generate reports for menu planning.''')
+    parser.add_argument('--warnings', '-w', default=False, action="store_true",
+            help="Show warnings")
+    parser.add_argument('--verbose', '-v', default=False, action="store_true",
+            help="Display lots of information about what's going on")
+    parser.add_argument('--strict', '-s', default=False, action="store_true",
+            help="Stop at the first problem with the spreadsheets")
+    parser.add_argument('--database', '-d', default=None,
+            help="Keep the model in a SQLite database at this path " +
+            "(use :memory: to keep it in memory)")
+    subparsers = parser.add_subparsers(title='subcommands')
+
+    buildParser = subparsers.add_parser('build', help=build.__doc__)
+    buildParser.add_argument('--reload', '-r', default=False, action="store_true",
+            help="Reload the data files before running")
+    buildParser.add_argument('--pipeline', '-p', default=False, action="store_true",
+            help="Fetch, read and render at the same time instead of in order")
+    buildParser.add_argument('--output', '-o', default=BUILD_TARGET,
+            help="The folder to build the reports in")
+    buildParser.add_argument('--timestamp', '-t', default=False, action="store_true",
+            help="Say when each report was generated (so every report changes)")
+    buildParser.add_argument('--memory-profile', '-m', nargs='?', const='text',
+            default=None, choices=['text', 'json'],
+            help="Report how much memory each stage of the build uses")
+    buildParser.set_defaults(command=build)
+
+    pdfParser = subparsers.add_parser('pdf', help=pdf.__doc__)
+    pdfParser.add_argument('--output', '-o', default=PRINT_TARGET,
+            help="The folder to write the PDFs in")
+    pdfParser.set_defaults(command=pdf)
+
+    reloadParser = subparsers.add_parser('reload', help=reload.__doc__)
+    reloadParser.set_defaults(command=reload)
+
+    checkParser = subparsers.add_parser('check', help=check.__doc__)
+    checkParser.add_argument('--json', '-j', default=False, action="store_true",
+            help="Report the problems as JSON")
+    checkParser.set_defaults(command=check)
+
+    whereParser = subparsers.add_parser('where', help=where.__doc__)
+    whereParser.add_argument('query', nargs='+',
+            help="Words from the ingredient's name, container, meal or notes")
+    whereParser.add_argument('--limit', '-n', default=10, type=int,
+            help="Show at most this many ingredients")
+    whereParser.set_defaults(command=where)
+
+    nutritionParser = subparsers.add_parser('nutrition', help=nutrition.__doc__)
+    nutritionParser.add_argument('--watch', '-W', default=False, action="store_true",
+            help="Add everything up again whenever a spreadsheet is saved")
+    nutritionParser.add_argument('--interval', '-i', default=1.0, type=float,
+            help="How many seconds to wait between looking for changes")
+    nutritionParser.add_argument('--limit', '-n', default=10, type=int,
+            help="Show at most this many menu items without nutrition")
+    nutritionParser.set_defaults(command=nutrition)
+
+    exportParser = subparsers.add_parser('export', help=export.__doc__)
+    exportParser.add_argument('report', nargs='*',
+            help="Which reports to export: %s (all of them, if none are given)" %
+            ', '.join(sorted(EXPORTS.keys())))
+    exportParser.add_argument('--output', '-o', default=None,
+            help="Write the JSON to this file instead of printing it")
+    exportParser.set_defaults(command=export)
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    # The spreadsheet settings and the templates use paths relative to the
+    # planner's folder, but output paths are relative to wherever we were
+    # run from.
+    if getattr(args, 'output', None):
+        args.output = os.path.abspath(args.output)
+    os.chdir(PLANNER_DIR)
+    try:
+        return args.command(args)
+    except ValueError as error:
+        # In strict mode, the model raises ValueError for bad data. Say
+        # what went wrong without a traceback.
+        print >> sys.stderr, "ERROR " + str(error)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
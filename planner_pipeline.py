@@ -0,0 +1,131 @@
+import threading
+import time
+
+# Normally planner.py does one thing at a time: download every spreadsheet,
+# then read every spreadsheet, then render every report. But most of that
+# time is spent waiting for Google Docs, and nothing says we have to wait
+# for the purchases to download before we start reading the ingredients.
+#
+# A PlannerPipeline breaks the work into tasks. Each task has a list of
+# other tasks it depends on, and each one runs in its own thread, starting
+# as soon as everything it depends on is done:
+#
+#   fetch ingredients -> parse ingredients -+-> parse menu items -+-> reports
+#   fetch menus ----------------------------+                     |
+#   fetch purchases -----------------------> parse purchases -----+
+#
+# All three downloads happen at once, so the whole thing takes about as long
+# as the slowest download plus the parsing that has to wait for it.
+#
+# Only one task at a time gets to touch the model or the view. Parsing and
+# rendering keep the processor busy, so they wouldn't go any faster side by
+# side anyway--the point is to get them done while we're waiting on the
+# network. To try it without Google Docs, serve a folder of csv files with
+# `python -m SimpleHTTPServer` and point the spreadsheet urls at it.
+class PlannerPipeline(object):
+    "Fetch, parse and render, starting each step as soon as it can go"
+
+    def __init__(self, model, view, loader=None, verbose=False):
+        # The model should have been created with load=False. If there's no
+        # loader, we use the spreadsheet files we already have.
+        self.model = model
+        self.view = view
+        self.loader = loader
+        self.verbose = verbose
+        self.tasks = []
+        self.modelLock = threading.Lock()
+
+    def build(self, buildPath):
+        "Run the whole pipeline, from fetching to writing reports"
+        settings = self.model.settings
+        start = time.time()
+
+        # First the downloads...
+        for part in ['ingredients', 'menus', 'purchases']:
+            self.add_task('fetch ' + part, self.fetch, [], settings[part])
+
+        # ...then the parsing. Menu items and purchases both look up their
+        # ingredients, so they have to wait for the ingredients too.
+        self.add_task('parse ingredients', self.model.load_ingredients,
+                ['fetch ingredients'])
+        self.add_task('parse menuItems', self.model.load_menu_items,
+                ['fetch menus', 'parse ingredients'])
+        self.add_task('parse purchases', self.model.load_purchases,
+                ['fetch purchases', 'parse ingredients'])
+        # The nutrition table isn't downloaded, so there's nothing to fetch.
+        self.add_task('parse nutrition', self.model.load_nutrition,
+                ['parse ingredients'])
+
+        # ...and finally the reports, each waiting for just what it reads.
+        self.view.prepare(buildPath)
+        for fileName, methodName, inputs in self.view.reports:
+            self.add_task('render ' + fileName, self.view.build_report,
+                    ['parse ' + i for i in inputs], buildPath, fileName,
+                    methodName)
+        self.add_task('finish', self.view.finish,
+                ['render ' + r[0] for r in self.view.reports], buildPath)
+
+        self.run()
+        self.log("Pipeline finished in %.3f seconds" % (time.time() - start))
+
+    def add_task(self, name, function, dependencies, *args):
+        "Add a task which will call function(*args) once its dependencies finish"
+        self.tasks.append({
+            'name': name,
+            'function': function,
+            'args': args,
+            'dependencies': dependencies,
+            'done': threading.Event(),
+            'error': None
+        })
+
+    # Start every task at once. Each thread waits for the tasks it depends on
+    # before doing anything. If one task fails, everything that depends on
+    # it gives up, and once all the threads are finished we raise the first
+    # error in the main thread, where the user will see it.
+    def run(self):
+        "Run all the tasks, raising the first error any of them hit"
+        tasksByName = dict((task['name'], task) for task in self.tasks)
+        threads = []
+        for task in self.tasks:
+            dependencies = [tasksByName[d] for d in task['dependencies']]
+            thread = threading.Thread(target=self.run_task,
+                    args=(task, dependencies), name=task['name'])
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        errors = [task['error'] for task in self.tasks if task['error']]
+        self.tasks = []
+        if any(errors):
+            raise errors[0]
+
+    def run_task(self, task, dependencies):
+        try:
+            for dependency in dependencies:
+                dependency['done'].wait()
+                if dependency['error']:
+                    task['error'] = dependency['error']
+                    return
+            started = time.time()
+            # Downloads don't touch the model, so they don't need the lock.
+            if task['name'].startswith('fetch'):
+                task['function'](*task['args'])
+            else:
+                with self.modelLock:
+                    task['function'](*task['args'])
+            self.log("%s took %.3f seconds" % (task['name'], time.time() - started))
+        except Exception as error:
+            task['error'] = error
+        finally:
+            task['done'].set()
+
+    def fetch(self, spreadsheet):
+        "Download a spreadsheet, if we have a loader"
+        if self.loader:
+            self.loader.load_spreadsheet(spreadsheet)
+
+    def log(self, message):
+        "Log a message"
+        if self.verbose:
+            print "INFO " + message
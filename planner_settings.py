@@ -0,0 +1,110 @@
+# These constants are shared by planner.py and planner_cli.py. We could have
+# passed them in to the program as arguments, but who has time for that? 
+# Each of these tells our program how to handle a particular spreadsheet--the
+# URL it should be loaded from, the filename where it can be found locally,
+# the number of junk rows at the top that should be skipped, and a list of 
+# the field names. The file can also be an .xlsx or .ods workbook (see
+# SheetReader), and if it is, 'sheet' can say which sheet to read.
+#
+# Where a spreadsheet has header rows, 'headers' says what each field's
+# column is called, so we find the columns by name instead of by position.
+# Capitals and extra spaces don't matter.
+INGREDIENTS = {
+    "url": 'https://docs.google.com/spreadsheet/ccc?key=0Au3OsR7L9ksedGpJdHRGWjlOaVFtZzkxRUhESEl6YlE&output=csv&gid=26',
+    "file": 'ingredients.csv',
+    "rowsToSkip": 0,
+    "fieldNames" : [
+        'name',
+        'buyStore',
+        'storage',
+        'buyStoreAlternate',
+        'notes'
+    ]
+ }
+MENUS = {
+    "url": 'https://docs.google.com/spreadsheet/ccc?key=0Au3OsR7L9ksedGpJdHRGWjlOaVFtZzkxRUhESEl6YlE&output=csv&gid=19',
+    "file": 'menus.csv',
+    "rowsToSkip": 4,
+    "fieldNames": [
+        'day',
+        'meal',
+        'mealType',
+        'dish',
+        'item',
+        'cookingNotes',
+        'quantity',
+        'isPrecooked',
+        'buyingNotes'
+    ],
+    "headers": {
+        'day': ['d', 'day'],
+        'meal': ['meal'],
+        'mealType': ['meal type'],
+        'dish': ['dish'],
+        'item': ['ingredients list', 'ingredient', 'item'],
+        'cookingNotes': ['cooking notes'],
+        'quantity': ['quantity / amount', 'quantity'],
+        'isPrecooked': ['pre-cooked?', 'precooked'],
+        'buyingNotes': ['buying notes']
+    }
+ }
+PURCHASES = {
+    "url":'https://docs.google.com/spreadsheet/ccc?key=0Au3OsR7L9ksedGpJdHRGWjlOaVFtZzkxRUhESEl6YlE&output=csv&gid=27',
+    "file": 'purchases.csv',
+    "rowsToSkip": 1,
+    "fieldNames": [
+        'name',
+        'count',
+        'unitsPerCount',
+        'unit',
+        'description',
+        'shoppingTrip',
+        'notes',
+        'day',
+        'meal'
+    ],
+    "headers": {
+        'name': ['item requested', 'name'],
+        'count': ['count'],
+        'unitsPerCount': ['size'],
+        'unit': ['measure in', 'unit'],
+        'description': ['item bought', 'description'],
+        'shoppingTrip': ['shopping trip'],
+        'notes': ['notes'],
+        'day': ['day'],
+        'meal': ['meal']
+    }
+ }
+# The nutrition table is ours, not a Google Doc, so it has no URL, and it's
+# fine if it doesn't exist yet. Each row is an ingredient and a unit, with
+# the calories, grams of protein and pounds in one of that unit. An
+# ingredient can have a row for each unit the menus use; a row with its
+# pounds filled in also covers menu items measured by weight.
+#
+# people and minimumCalories are for the nutrition report: the menu's
+# quantities feed everybody, and a day with fewer calories per person
+# than minimumCalories gets flagged.
+NUTRITION = {
+    "file": 'nutrition.csv',
+    "rowsToSkip": 1,
+    "fieldNames": [
+        'name',
+        'unit',
+        'calories',
+        'protein',
+        'pounds'
+    ],
+    "headers": {
+        'name': ['ingredient', 'name'],
+        'unit': ['unit'],
+        'calories': ['calories', 'kcal'],
+        'protein': ['protein', 'protein (g)'],
+        'pounds': ['pounds', 'weight (lb)', 'lb']
+    },
+    "people": 16,
+    "minimumCalories": 3000
+ }
+BUILD_TARGET = '_build'
+# PDFs for printing go here. This folder is never emptied, so we can tell
+# which pages changed since the last time we printed.
+PRINT_TARGET = '_print'
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+
+from page_layout import PageLayout
+from pdf_writer import PdfWriter
+
+# PrintView is like FoodPlannerView, but instead of web pages it makes PDFs
+# of the lists we print and take on the river: the pack list and the cook
+# list. Every page of every PDF gets a hash (a fingerprint of its contents),
+# which we save next to the PDF. The next time we build, any page whose hash
+# hasn't changed is exactly the same as the copy we already printed, so we
+# also write a "reprint" PDF with only the pages that did change.
+class PrintView(object):
+
+    # Each printed list is a file name, the method which turns the model's
+    # data into blocks of rows, and how wide each column is.
+    documents = [
+        ("PackList", "pack_list_blocks", [0.4, 0.2, 0.4]),
+        ("CookList", "cook_list_blocks", [0.4, 0.3, 0.3])
+    ]
+
+    def __init__(self, model):
+        self.model = model
+
+    # Unlike FoodPlannerView, we don't empty the folder first: we need last
+    # time's page hashes to know which pages changed.
+    def build(self, printPath):
+        "Write a PDF of each list, and a PDF of the pages that changed"
+        if not os.path.isdir(printPath):
+            os.mkdir(printPath)
+        changes = {}
+        for name, methodName, columns in self.documents:
+            changes[name] = self.build_document(printPath, name,
+                    getattr(self, methodName)(), columns)
+        return changes
+
+    def build_document(self, printPath, name, blocks, columns):
+        "Write one list to a PDF, returning the numbers of the pages that changed"
+        title = name.replace('List', ' List')
+        pages = PageLayout(title, columns).write(blocks,
+                os.path.join(printPath, name + '.pdf'))
+        hashes = [hashlib.sha1(page).hexdigest() for page in pages]
+
+        hashFile = os.path.join(printPath, name + '.pages.json')
+        oldHashes = []
+        if os.path.exists(hashFile):
+            with open(hashFile) as oldHashFile:
+                oldHashes = json.load(oldHashFile)
+        changedPages = [number + 1 for number, pageHash in enumerate(hashes)
+                if number >= len(oldHashes) or oldHashes[number] != pageHash]
+
+        # Only bother with a reprint if something changed since last time
+        reprintFile = os.path.join(printPath, name + '.reprint.pdf')
+        if os.path.exists(reprintFile):
+            os.remove(reprintFile)
+        if any(oldHashes) and any(changedPages):
+            reprint = PdfWriter()
+            for number in changedPages:
+                reprint.add_page(pages[number - 1])
+            reprint.write(reprintFile)
+
+        with open(hashFile, 'w') as newHashFile:
+            json.dump(hashes, newHashFile, indent=2)
+        return changedPages
+
+    # ===============
+    # Blocks
+    # ===============
+
+    def pack_list_blocks(self):
+        "One block per container, listing what goes in it"
+        return [{
+            'title': container['name'],
+            'rows': [[self.quantity(item), item['buyStore'], item['notes']]
+                    for item in container['itemList']]
+        } for container in self.model.get_pack_list()['containers']]
+
+    def cook_list_blocks(self):
+        "One block per meal, listing its ingredients and where to find them"
+        return [{
+            'title': "Day %s %s" % (meal['day'], meal['name']),
+            'rows': [[self.quantity(ingredient), ingredient['container'],
+                    ingredient['notes']] for ingredient in meal['ingredients']]
+        } for meal in self.model.get_cook_list()['meals']]
+
+    def quantity(self, item):
+        "Describe how much of an item there is, like '2 lb almonds'"
+        quantity = item['quantity']
+        # Print 2.0 as 2, and 0.3333333333 as 0.333333
+        if isinstance(quantity, float):
+            quantity = "%g" % quantity
+        return "%s %s %s" % (quantity, item['unit'], item['name'])
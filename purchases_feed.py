@@ -0,0 +1,153 @@
+import csv
+import hashlib
+import os
+
+from sheet_reader import SheetReader
+
+# While we're out shopping, people keep adding rows to the bottom of
+# purchases.csv. Re-reading the whole file every time is wasteful, so a
+# PurchasesFeed remembers how far into the file it has read (a byte offset)
+# and a hash of everything before that point. Each time update() is called,
+# it only parses the rows that were added since last time, and adds them to
+# running totals of how much of each (name, unit) has been bought.
+#
+# If any row we've already read was edited or deleted, the bytes before the
+# offset won't hash the same anymore. When that happens, we give up on
+# being clever and reload the whole file. Reading and hashing those bytes
+# is quick; it's parsing and cleaning the rows that we're saving.
+#
+# A last row without a newline might be somebody halfway through typing
+# it, so we leave it for next time instead of reading half a purchase.
+# Byte offsets only make sense in a CSV file, so the feed only follows
+# purchases.csv, not a workbook.
+#
+# Use it like this:
+#   feed = PurchasesFeed(model)
+#   ...somebody adds rows to purchases.csv...
+#   changed = feed.update()
+#   for name, unit in changed:
+#       print name, feed.get_quantity_still_needed(name, unit)
+class PurchasesFeed(object):
+    "Keep a model's purchases up to date as rows are added to purchases.csv"
+
+    def __init__(self, model, verbose=False):
+        self.model = model
+        self.verbose = verbose
+        self.settings = model.settings['purchases']
+
+        # How much of each (name, unit) the menus call for. The menus don't
+        # change while we're shopping, so we only add these up once.
+        self.requiredTotals = {}
+        for menuItem in model.menuItems:
+            key = (menuItem['name'], menuItem['unit'])
+            self.requiredTotals[key] = (self.requiredTotals.get(key, 0) +
+                    menuItem['quantity'])
+
+        self.reload()
+
+    def reload(self):
+        "Read the whole purchases file again, starting the totals over"
+        self.log("Reloading all purchases from %s" % self.settings['file'])
+        self.offset = 0
+        # A hash of every byte before the offset, added to as we read more
+        self.readHash = hashlib.sha1()
+        self.headerRows = []
+        # From now on, the model asks us how much has been purchased.
+        self.totals = {}
+        self.model.purchaseTotals = self.totals
+        self.model.clear_purchases()
+        return self.read_new_rows()
+
+    def update(self):
+        """Read any rows added since the last update, returning the set of
+        (name, unit) pairs whose totals changed"""
+        if self.file_was_rewritten():
+            return self.reload()
+        return self.read_new_rows()
+
+    def get_quantity_purchased(self, itemName, unit):
+        return self.totals.get((itemName, unit), 0)
+
+    def get_quantity_required(self, itemName, unit):
+        return self.requiredTotals.get((itemName, unit), 0)
+
+    def get_quantity_still_needed(self, itemName, unit):
+        return (self.get_quantity_required(itemName, unit) -
+                self.get_quantity_purchased(itemName, unit))
+
+    # ===============
+    # Helpers
+    # ===============
+
+    # Check whether anything we've already read has changed. If the file
+    # got shorter, or the part we've read doesn't hash the same anymore,
+    # then someone changed or deleted an earlier row.
+    def file_was_rewritten(self):
+        if os.path.getsize(self.settings['file']) < self.offset:
+            self.log("%s got shorter" % self.settings['file'])
+            return True
+        with open(self.settings['file'], 'rb') as purchasesFile:
+            alreadyRead = purchasesFile.read(self.offset)
+        if self.hash(alreadyRead) != self.readHash.hexdigest():
+            self.log("A purchase we already read has changed")
+            return True
+        return False
+
+    def read_new_rows(self):
+        "Read the finished rows from the offset to the end of the file"
+        with open(self.settings['file'], 'rb') as purchasesFile:
+            purchasesFile.seek(self.offset)
+            data = self.finished_rows(purchasesFile.read())
+        if not data:
+            return set()
+        self.offset += len(data)
+        self.readHash.update(data)
+
+        reader = csv.reader(data.splitlines(True))
+        # The header rows might not all have been there last time. We keep
+        # them, since they tell us which column is which.
+        while len(self.headerRows) < self.settings['rowsToSkip']:
+            headerRow = next(reader, None)
+            if headerRow is None:
+                break
+            self.headerRows.append(headerRow)
+            self.log("Skipping header row: %s" % headerRow)
+
+        # The model cleans up the new purchases exactly the way it cleans
+        # up purchases when it's generating them.
+        sheetReader = SheetReader()
+        columns = sheetReader.header_columns(self.settings, self.headerRows)
+        # A newline added to the end of a row we already read shows up
+        # as an empty row, so we skip those.
+        newPurchases = list(self.model.clean_purchases(
+                sheetReader.to_dict(self.settings['fieldNames'], columns, cells)
+                for cells in reader if any(cell.strip() for cell in cells)))
+
+        changed = set()
+        for purchase in newPurchases:
+            key = (purchase['name'], purchase['unit'])
+            self.totals[key] = (self.totals.get(key, 0) +
+                    purchase['count'] * purchase['unitsPerCount'])
+            changed.add(key)
+        # Adding the purchases to the model tells it that its cached reports
+        # are out of date, so we do that once the totals are ready.
+        self.model.add_purchases(newPurchases)
+        self.log("Read %s new purchases" % len(newPurchases))
+        return changed
+
+    def finished_rows(self, data):
+        "Cut off the last row of data if it doesn't end in a newline yet"
+        end = max(data.rfind('\n'), data.rfind('\r')) + 1
+        # A quoted cell can hold newlines, so if we'd be stopping inside
+        # quotes (an odd number of quote marks), back up to an earlier line.
+        while end > 0 and data.count('"', 0, end) % 2:
+            end = max(data.rfind('\n', 0, end - 1), data.rfind('\r', 0, end - 1)) + 1
+        return data[:end]
+
+    def hash(self, data):
+        return hashlib.sha1(data).hexdigest()
+
+    def log(self, message):
+        "Log a message"
+        if self.verbose:
+            print "INFO " + message
@@ -0,0 +1,185 @@
+import bisect
+import json
+import re
+
+# Which parts of an ingredient's entry a word can come from. A word in the
+# name counts for more than a word in a container or a note.
+FIELD_WEIGHTS = {
+    "name": 4,
+    "container": 2,
+    "meal": 2,
+    "notes": 1
+}
+
+# A SearchIndex answers "where is it?": where's the cumin, which meals use
+# it, and which bag is it in? It keeps one entry per ingredient, listing
+# everywhere the ingredient gets packed, and an inverted index: for every
+# word that appears anywhere in an entry, the entries it appears in. Looking
+# up a word is then a single dict lookup instead of a search through every
+# ingredient.
+#
+# Each word you search for can match in three ways:
+#   exactly:     "cumin" finds cumin
+#   as a prefix: "cum" finds cumin and cumberland sausage
+#   fuzzily:     "cumni" finds cumin (one letter wrong, missing or extra,
+#                or two letters swapped)
+# For fuzzy matching, we also index every way of deleting one letter from
+# each word. Two words which are one edit apart always become the same word
+# when we delete (at most) one letter from each, so finding fuzzy matches
+# takes just a few more dict lookups.
+class SearchIndex(object):
+    "Look up ingredients, and where they're packed, by any word"
+
+    def __init__(self, entries):
+        # entries is a list of dicts, one per ingredient. See from_model.
+        self.entries = entries
+        self.words = {}
+        for entryNumber, entry in enumerate(entries):
+            for field, text in self.entry_fields(entry):
+                for word in self.tokenize(text):
+                    fields = self.words.setdefault(word, {})
+                    fields[entryNumber] = max(fields.get(entryNumber, 0),
+                            FIELD_WEIGHTS[field])
+        self.sortedWords = sorted(self.words)
+        self.deletions = {}
+        for word in self.sortedWords:
+            for deletion in self.deletions_of(word):
+                self.deletions.setdefault(deletion, set()).add(word)
+
+    # Build the entries from the model's cook list (which knows which bag
+    # each ingredient goes in for each meal) and its pack list (which also
+    # knows about ingredients which aren't part of any meal).
+    @classmethod
+    def from_model(cls, model):
+        "Build a SearchIndex of everything in a model"
+        entries = {}
+        for ingredient in model.ingredients:
+            if not ingredient['name'] in entries:
+                entries[ingredient['name']] = {
+                    'name': ingredient['name'],
+                    'storage': ingredient['storage'],
+                    'buyStore': ingredient['buyStore'],
+                    'notes': ingredient['notes'],
+                    'places': []
+                }
+        for meal in model.get_cook_list()['meals']:
+            for ingredient in meal['ingredients']:
+                entries[ingredient['name']]['places'].append({
+                    'container': ingredient['container'],
+                    'meal': "Day %s %s" % (meal['day'], meal['name']),
+                    'quantity': "%s %s" % (ingredient['quantity'], ingredient['unit'])
+                })
+        for container in model.get_pack_list()['containers']:
+            for item in container['itemList']:
+                places = entries[item['name']]['places']
+                if not any(p['container'] == container['name'] for p in places):
+                    places.append({
+                        'container': container['name'],
+                        'meal': '',
+                        'quantity': "%s %s" % (item['quantity'], item['unit'])
+                    })
+        return cls([entries[name] for name in sorted(entries)])
+
+    def search(self, query, limit=10):
+        "Return the entries matching every word in query, best matches first"
+        scores = None
+        for queryWord in self.tokenize(query):
+            wordScores = self.match_word(queryWord)
+            if scores is None:
+                scores = wordScores
+            else:
+                scores = dict((entry, scores[entry] + score)
+                        for entry, score in wordScores.iteritems() if entry in scores)
+        if not scores:
+            return []
+        ranked = sorted(scores, key=lambda entry: (-scores[entry],
+                self.entries[entry]['name']))
+        return [self.entries[entry] for entry in ranked[:limit]]
+
+    # ===============
+    # Saving and loading
+    # ===============
+
+    # We save just the entries; rebuilding the word lists from them is quick.
+    def to_json(self):
+        return json.dumps({'entries': self.entries}, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, jsonString):
+        return cls(json.loads(jsonString)['entries'])
+
+    # The lookup page does its searching in the browser, so it needs the
+    # words too. We escape '</' so the JSON can go inside a <script> tag.
+    def to_page_json(self):
+        words = dict((word, sorted(fields.items()))
+                for word, fields in self.words.iteritems())
+        return json.dumps({'entries': self.entries, 'words': words},
+                sort_keys=True).replace('</', '<\\/')
+
+    # ===============
+    # Helpers
+    # ===============
+
+    def match_word(self, queryWord):
+        "Return a dict of entry number to score for one word of a query"
+        # Exact matches count fully, prefixes a bit less, and fuzzy matches
+        # only if nothing else matched.
+        scores = {}
+        self.add_scores(scores, [queryWord], 1.0)
+        # The words starting with queryWord are all together in the sorted
+        # list, right where queryWord would go.
+        position = bisect.bisect_left(self.sortedWords, queryWord)
+        prefixMatches = []
+        while (position < len(self.sortedWords) and
+                self.sortedWords[position].startswith(queryWord)):
+            if self.sortedWords[position] != queryWord:
+                prefixMatches.append(self.sortedWords[position])
+            position += 1
+        self.add_scores(scores, prefixMatches, 0.75)
+        if not scores:
+            fuzzyMatches = set()
+            for deletion in self.deletions_of(queryWord):
+                fuzzyMatches.update(self.deletions.get(deletion, []))
+            self.add_scores(scores, [w for w in fuzzyMatches
+                    if self.one_edit_apart(queryWord, w)], 0.5)
+        return scores
+
+    def add_scores(self, scores, words, factor):
+        for word in words:
+            for entry, weight in self.words.get(word, {}).iteritems():
+                scores[entry] = max(scores.get(entry, 0), weight * factor)
+
+    def entry_fields(self, entry):
+        "Yield each (field, text) of an entry that we index"
+        yield 'name', entry['name']
+        yield 'notes', entry['notes']
+        for place in entry['places']:
+            yield 'container', place['container']
+            yield 'meal', place['meal']
+
+    def tokenize(self, text):
+        return re.findall(r"[a-z0-9]+", (text or '').lower())
+
+    def deletions_of(self, word):
+        "Return the word itself, and the word with each letter deleted"
+        deletions = set([word])
+        if len(word) > 2:
+            deletions.update(word[:i] + word[i + 1:] for i in range(len(word)))
+        return deletions
+
+    def one_edit_apart(self, first, second):
+        """Check whether one letter changed, added or removed (or two letters
+        swapped) makes first into second"""
+        if abs(len(first) - len(second)) > 1:
+            return False
+        if len(first) == len(second):
+            differences = [i for i in range(len(first)) if first[i] != second[i]]
+            if len(differences) == 2 and differences[1] == differences[0] + 1:
+                i = differences[0]
+                return first[i] == second[i + 1] and first[i + 1] == second[i]
+            return len(differences) <= 1
+        shorter, longer = sorted([first, second], key=len)
+        for i in range(len(longer)):
+            if longer[:i] + longer[i + 1:] == shorter:
+                return True
+        return False
@@ -0,0 +1,46 @@
+# Install the planner with
+#   pip install -e .
+# and you get a food-planner command that runs planner_cli.py from
+# anywhere: food-planner build, food-planner where almonds, and so on.
+#
+# Install it with -e (editable), so the command keeps running the code in
+# this folder. The planner reads its spreadsheets and templates from the
+# folder planner_cli.py is in, and a plain install would copy the code
+# somewhere without them.
+from setuptools import setup
+
+setup(
+    name='grand-food-planner',
+    version='0.1',
+    description='Generate reports for grand canyon food planning',
+    py_modules=[
+        'consumption_timeline',
+        'food_planner_model',
+        'food_planner_view',
+        'frozen_dict',
+        'ingredient_consistency',
+        'memory_profiler',
+        'nutrition_rollup',
+        'page_layout',
+        'pdf_writer',
+        'planner_cli',
+        'planner_pipeline',
+        'planner_settings',
+        'print_view',
+        'purchases_feed',
+        'search_index',
+        'sheet_reader',
+        'spreadsheet_checker',
+        'spreadsheet_loader',
+        'sqlite_food_planner_model'
+    ],
+    install_requires=[
+        'jinja2',
+        'requests'
+    ],
+    entry_points={
+        'console_scripts': [
+            'food-planner = planner_cli:main'
+        ]
+    }
+)
@@ -0,0 +1,290 @@
+import csv
+import os
+import zipfile
+
+# The XML namespaces used inside .xlsx and .ods files
+XLSX_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_RELATIONSHIPS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+ODS_TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+ODS_TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+# The last sheet we read from each file, along with the time the file was
+# last changed. If the file hasn't changed since, we use these rows again
+# instead of reading it again. Only one sheet per file is kept, and a
+# SheetReader made with cache=False neither uses nor fills this, so a
+# huge sheet can be streamed through without all of it staying here.
+_cache = {}
+
+# A SheetReader reads the rows of a spreadsheet, whether it's a CSV file,
+# an Excel workbook (.xlsx) or an OpenOffice/LibreOffice one (.ods). So we
+# can save the spreadsheets straight from Excel or LibreOffice instead of
+# exporting each one to CSV by hand. If the settings ask for menus.csv and
+# there isn't one, but there's a menus.xlsx or menus.ods, we read that.
+#
+# Workbooks are zip files full of XML. We read the XML one row at a time,
+# throwing each row away once we've got its cells, so even a huge sheet
+# never has to fit in memory as XML. Without a 'sheet' in the settings, we
+# read the workbook's first sheet.
+#
+# Each spreadsheet's settings say which field each column holds, in one of
+# two ways:
+#   fieldNames: the fields, in column order. This is all the ingredients
+#               spreadsheet has, since it has no header row.
+#   headers:    for each field, the header text of its column. We look
+#               for these in the rowsToSkip rows at the top of the sheet,
+#               so inserting or moving a column doesn't shift everything
+#               after it into the wrong field.
+# Either way, each row comes back as a dict with exactly the fields in
+# fieldNames. Columns we don't know about are left out.
+class SheetReader(object):
+    "Read rows from CSV, XLSX and ODS spreadsheets"
+
+    # Each kind of file, and the method which reads its cells. To read
+    # another kind, add a method which yields (row number, list of cells).
+    formats = [
+        (".csv", "csv_rows"),
+        (".xlsx", "xlsx_rows"),
+        (".ods", "ods_rows")
+    ]
+
+    def __init__(self, cache=True):
+        self.cache = cache
+
+    def read(self, fileSettings):
+        "Return a list of dicts, one for each row after the header rows"
+        return [row for rowNumber, row in self.records(fileSettings)]
+
+    def records(self, fileSettings):
+        "Yield the row number and a dict of each row after the header rows"
+        headerRows = []
+        columns = None
+        # Like csv.DictReader, we fill in None for cells past the end of a
+        # short row in a CSV file. Workbooks leave out the empty cells at
+        # the end of every row, so there we fill in empty strings, just as
+        # if the sheet had been exported to CSV.
+        if self.format_method(self.find_file(fileSettings['file'])) == 'csv_rows':
+            missing = None
+        else:
+            missing = ''
+        for rowNumber, cells in self.rows(fileSettings):
+            if len(headerRows) < fileSettings['rowsToSkip']:
+                headerRows.append(cells)
+                continue
+            if columns is None:
+                columns = self.header_columns(fileSettings, headerRows)
+            yield rowNumber, self.to_dict(fileSettings['fieldNames'], columns,
+                    cells, missing)
+
+    def rows(self, fileSettings):
+        "Yield the row number and list of cells of every row in a spreadsheet"
+        fileName = self.find_file(fileSettings['file'])
+        sheet = fileSettings.get('sheet')
+        readRows = getattr(self, self.format_method(fileName))
+        if not self.cache:
+            for row in readRows(fileName, sheet):
+                yield row
+            return
+
+        key = os.path.abspath(fileName)
+        try:
+            modified = os.path.getmtime(fileName)
+        except OSError:
+            modified = None
+        cached = _cache.get(key)
+        if cached is not None and cached[:2] == (sheet, modified):
+            for row in cached[2]:
+                yield row
+            return
+
+        rows = []
+        for rowNumber, cells in readRows(fileName, sheet):
+            row = (rowNumber, tuple(cells))
+            rows.append(row)
+            yield row
+        _cache[key] = (sheet, modified, rows)
+
+    # ===============
+    # Columns
+    # ===============
+
+    def header_columns(self, fileSettings, headerRows):
+        "Return the column number of each field, or None if we go by position"
+        headers = fileSettings.get('headers')
+        if not headers:
+            return None
+        columns = []
+        for field in fileSettings['fieldNames']:
+            wanted = set(self.normalize(h) for h in headers[field])
+            found = [i for row in headerRows for i, cell in enumerate(row)
+                    if self.normalize(cell) in wanted]
+            if not found:
+                raise ValueError("Can't find a column for %s in %s: looked for %s" %
+                        (field, fileSettings['file'], ', '.join(headers[field])))
+            columns.append(found[0])
+        return columns
+
+    def to_dict(self, fieldNames, columns, cells, missing=None):
+        "Turn a row's cells into a dict of fields, given each field's column"
+        if columns is None:
+            columns = range(len(fieldNames))
+        return dict((field, cells[column] if column < len(cells) else missing)
+                for field, column in zip(fieldNames, columns))
+
+    def normalize(self, header):
+        return ' '.join((header or '').lower().split())
+
+    # ===============
+    # Files
+    # ===============
+
+    def find_file(self, fileName):
+        "Find a spreadsheet, trying other kinds of file if there's no such file"
+        if os.path.exists(fileName):
+            return fileName
+        base = os.path.splitext(fileName)[0]
+        for extension, methodName in self.formats:
+            if os.path.exists(base + extension):
+                return base + extension
+        return fileName
+
+    def format_method(self, fileName):
+        extension = os.path.splitext(fileName)[1].lower()
+        for formatExtension, methodName in self.formats:
+            if extension == formatExtension:
+                return methodName
+        raise ValueError("Don't know how to read %s" % fileName)
+
+    def csv_rows(self, fileName, sheet):
+        with open(fileName) as csvFile:
+            reader = csv.reader(csvFile)
+            for cells in reader:
+                # A quoted cell can run over several lines, so we count
+                # lines just like csv.DictReader does.
+                yield reader.line_num, cells
+
+    # An .xlsx file keeps each sheet in its own XML file, with each row like
+    #   <row r="2"><c r="A2" t="s"><v>3</v></c><c r="C2"><v>16</v></c></row>
+    # Text cells (t="s") hold a number, which is the text's place in the
+    # list of shared strings. Empty cells and rows are left out, so we use
+    # the "r" references to put everything back in its place.
+    def xlsx_rows(self, fileName, sheet):
+        from xml.etree import cElementTree as ElementTree
+        with zipfile.ZipFile(fileName) as workbook:
+            sharedStrings = []
+            if 'xl/sharedStrings.xml' in workbook.namelist():
+                for event, element in ElementTree.iterparse(
+                        workbook.open('xl/sharedStrings.xml')):
+                    if element.tag == XLSX_MAIN + 'si':
+                        sharedStrings.append(''.join(t.text or '' for t in
+                                element.iter(XLSX_MAIN + 't')))
+                        element.clear()
+
+            expectedRow = 1
+            sheetFile = workbook.open(self.xlsx_sheet_path(workbook, sheet, ElementTree))
+            for event, element in ElementTree.iterparse(sheetFile):
+                if element.tag != XLSX_MAIN + 'row':
+                    continue
+                rowNumber = int(element.get('r', expectedRow))
+                while expectedRow < rowNumber:
+                    yield expectedRow, []
+                    expectedRow += 1
+                cells = []
+                for cell in element.iter(XLSX_MAIN + 'c'):
+                    column = self.xlsx_column(cell.get('r')) if cell.get('r') else len(cells)
+                    cells.extend([''] * (column - len(cells)))
+                    cells.append(self.xlsx_value(cell, sharedStrings))
+                yield rowNumber, cells
+                expectedRow = rowNumber + 1
+                element.clear()
+
+    def xlsx_sheet_path(self, workbook, sheet, ElementTree):
+        "Find the file inside an .xlsx which holds a sheet (or the first sheet)"
+        sheets = ElementTree.parse(workbook.open('xl/workbook.xml')).getroot().iter(
+                XLSX_MAIN + 'sheet')
+        targets = dict((r.get('Id'), r.get('Target')) for r in ElementTree.parse(
+                workbook.open('xl/_rels/workbook.xml.rels')).getroot().iter(
+                XLSX_PACKAGE + 'Relationship'))
+        for eachSheet in sheets:
+            if sheet is None or eachSheet.get('name') == sheet:
+                target = targets[eachSheet.get(XLSX_RELATIONSHIPS + 'id')]
+                return target.lstrip('/') if target.startswith('/xl/') else 'xl/' + target
+        raise ValueError("There's no sheet named %s" % sheet)
+
+    def xlsx_column(self, reference):
+        "Turn a cell reference like 'AB12' into a column number (27)"
+        column = 0
+        for letter in reference:
+            if not letter.isalpha():
+                break
+            column = column * 26 + ord(letter.upper()) - ord('A') + 1
+        return column - 1
+
+    def xlsx_value(self, cell, sharedStrings):
+        cellType = cell.get('t')
+        if cellType == 'inlineStr':
+            return ''.join(t.text or '' for t in cell.iter(XLSX_MAIN + 't')).encode('utf-8')
+        value = cell.findtext(XLSX_MAIN + 'v') or ''
+        if cellType == 's':
+            return sharedStrings[int(value)].encode('utf-8')
+        if cellType == 'b':
+            return 'TRUE' if value == '1' else 'FALSE'
+        if cellType in (None, 'n') and value:
+            # Write numbers the way a CSV export would: 16, not 16.0
+            number = float(value)
+            return str(int(number)) if number.is_integer() else repr(number)
+        return value.encode('utf-8')
+
+    # An .ods file keeps all its sheets in content.xml, with each row like
+    #   <table:table-row><table:table-cell><text:p>almonds</text:p>
+    #   </table:table-cell><table:table-cell/></table:table-row>
+    # A row or cell can stand for several identical ones in a row, which
+    # is how a sheet says "and then a million empty rows", so we only write
+    # out repeated rows and cells when there's something after them.
+    def ods_rows(self, fileName, sheet):
+        from xml.etree import cElementTree as ElementTree
+        with zipfile.ZipFile(fileName) as workbook:
+            rowNumber = 0
+            emptyRows = 0
+            inSheet = False
+            for event, element in ElementTree.iterparse(workbook.open('content.xml'),
+                    events=('start', 'end')):
+                if element.tag == ODS_TABLE + 'table':
+                    if event == 'start':
+                        inSheet = sheet is None or element.get(ODS_TABLE + 'name') == sheet
+                    elif inSheet:
+                        return
+                    continue
+                if not inSheet or event != 'end' or element.tag != ODS_TABLE + 'table-row':
+                    continue
+                cells = self.ods_cells(element)
+                repeat = int(element.get(ODS_TABLE + 'number-rows-repeated', 1))
+                element.clear()
+                if not any(cells):
+                    emptyRows += repeat
+                    continue
+                for i in range(emptyRows):
+                    rowNumber += 1
+                    yield rowNumber, []
+                emptyRows = 0
+                for i in range(repeat):
+                    rowNumber += 1
+                    yield rowNumber, list(cells)
+        if sheet is not None and not inSheet:
+            raise ValueError("There's no sheet named %s" % sheet)
+
+    def ods_cells(self, row):
+        cells = []
+        emptyCells = 0
+        for cell in row:
+            if not cell.tag in (ODS_TABLE + 'table-cell', ODS_TABLE + 'covered-table-cell'):
+                continue
+            text = '\n'.join(''.join(p.itertext()) for p in cell.iter(ODS_TEXT + 'p'))
+            repeat = int(cell.get(ODS_TABLE + 'number-columns-repeated', 1))
+            if not text:
+                emptyCells += repeat
+                continue
+            cells.extend([''] * emptyCells)
+            emptyCells = 0
+            cells.extend([text.encode('utf-8')] * repeat)
+        return cells
@@ -0,0 +1,190 @@
+import json
+import re
+
+from food_planner_model import FoodPlannerModel, STORAGE_LOCATIONS
+from sheet_reader import SheetReader
+
+# The meals get_cook_list knows how to name
+MEAL_CODES = ['1B', '2L', '3D']
+
+# A SpreadsheetChecker looks for problems in the three spreadsheets without
+# building a model. The model stops at the first problem in strict mode,
+# and it can't tell you anything until it has read everything. The checker
+# reads each spreadsheet once, top to bottom, and remembers what it needs
+# for later spreadsheets in dicts and sets, so every lookup is instant. It
+# keeps going after a problem, so you see all of them at once, each with
+# the row it's on.
+#
+# Each problem is a dict like this:
+#   {"file": "menus.csv", "row": 12, "severity": "error",
+#    "check": "unknown-ingredient", "message": "..."}
+# Errors are things the model would refuse in strict mode. Warnings are
+# things it would quietly accept, but which are probably mistakes.
+class SpreadsheetChecker(object):
+    "Find problems in the ingredients, menus and purchases spreadsheets"
+
+    def __init__(self, ingredients=None, menus=None, purchases=None):
+        self.settings = {
+            "ingredients"   : ingredients,
+            "menus"         : menus,
+            "purchases"     : purchases
+        }
+        # We borrow the model's helpers (parsing quantities, stripping
+        # strings) so that we judge each row exactly the way it would. With
+        # load=False, the model doesn't read anything.
+        self.model = FoodPlannerModel(ingredients=ingredients, menus=menus,
+                purchases=purchases, load=False)
+        self.problems = []
+
+    def check(self):
+        "Check all three spreadsheets, returning a list of problems"
+        self.problems = []
+        self.check_ingredients()
+        self.check_menus()
+        self.check_purchases()
+        return self.problems
+
+    def check_ingredients(self):
+        # For each ingredient name, the row it first appears on and its data
+        self.ingredients = {}
+        for rowNumber, ingredient in self.read_rows('ingredients'):
+            if not ingredient['name']:
+                continue
+            name = ingredient['name']
+            storage = ingredient['storage'] or 'NO STORAGE LOCATION'
+            if not storage in STORAGE_LOCATIONS:
+                self.error('ingredients', rowNumber, 'invalid-storage',
+                        "Ingredient %s has an invalid storage location: %s" %
+                        (name, storage))
+
+            first = self.ingredients.get(name)
+            if first is None:
+                self.ingredients[name] = dict(ingredient, row=rowNumber)
+                continue
+            self.error('ingredients', rowNumber, 'duplicate-ingredient',
+                    "Ingredient %s is already listed on row %s" %
+                    (name, first['row']))
+            for prop, check in [('buyStore', 'store-conflict'),
+                    ('storage', 'storage-conflict')]:
+                if (ingredient[prop] or '') != (first[prop] or ''):
+                    self.error('ingredients', rowNumber, check,
+                            "Ingredient %s has %s '%s' here but '%s' on row %s" %
+                            (name, prop, ingredient[prop], first[prop], first['row']))
+
+    def check_menus(self):
+        # Purchases can name a day, a meal, both, or neither, so we remember
+        # every combination that appears on the menu.
+        self.menuKeys = set()
+        for rowNumber, menuItem in self.read_rows('menus'):
+            if not menuItem['item']:
+                continue
+            name = menuItem['item']
+            missing = self.model.missing_properties(menuItem,
+                    ['day', 'meal', 'item', 'quantity'])
+            if any(missing):
+                self.error('menus', rowNumber, 'missing-property',
+                        "Menu item %s is missing %s" % (name, ', '.join(missing)))
+                continue
+            if not name in self.ingredients:
+                self.error('menus', rowNumber, 'unknown-ingredient',
+                        "There is no ingredient named %s" % name)
+                continue
+
+            day, meal = menuItem['day'], menuItem['meal']
+            if day or meal:
+                if not re.match(r'^\d+$', day) or not meal in MEAL_CODES:
+                    self.error('menus', rowNumber, 'invalid-meal',
+                            "Menu item %s has day '%s' and meal '%s'; days " %
+                            (name, day, meal) + "should be numbers and meals " +
+                            "one of %s" % ', '.join(MEAL_CODES))
+
+            # A quantity that only parses as a unit, even though it has a
+            # number in it, has lost its number along the way.
+            quantity = self.model.parse_quantity_string(str(menuItem['quantity']))
+            if (quantity['parseMethod'] == 'unitNoQuantity' and
+                    re.search(r'\d', menuItem['quantity'])):
+                self.warning('menus', rowNumber, 'unparseable-quantity',
+                        "Couldn't read a number from quantity '%s' for %s" %
+                        (menuItem['quantity'], name))
+
+            self.menuKeys.update([(name, None, None), (name, day, None),
+                    (name, None, meal), (name, day, meal)])
+
+    def check_purchases(self):
+        for rowNumber, purchase in self.read_rows('purchases', strip=False):
+            name = (purchase['name'] or '').lower()
+            if not name:
+                continue
+            # A missing unitsPerCount means 1, but there has to be a count.
+            if not purchase['count']:
+                self.error('purchases', rowNumber, 'invalid-number',
+                        "Purchase of %s has no count" % name)
+            for prop in ['count', 'unitsPerCount']:
+                if purchase[prop] and not self.is_number(purchase[prop]):
+                    self.error('purchases', rowNumber, 'invalid-number',
+                            "Purchase of %s has a %s of '%s', which isn't a number" %
+                            (name, prop, purchase[prop]))
+            if not name in self.ingredients:
+                self.error('purchases', rowNumber, 'unknown-ingredient',
+                        "There is no ingredient named %s" % name)
+                continue
+            key = (name, purchase['day'] or None, purchase['meal'] or None)
+            if not key in self.menuKeys:
+                self.error('purchases', rowNumber, 'unmatched-purchase',
+                        "Can't find a menu item matching the purchase of %s" % name)
+
+    # ===============
+    # Reporting
+    # ===============
+
+    def has_errors(self):
+        return any(p for p in self.problems if p['severity'] == 'error')
+
+    def report_json(self):
+        "Return the problems as JSON"
+        counts = {}
+        for problem in self.problems:
+            counts[problem['check']] = counts.get(problem['check'], 0) + 1
+        return json.dumps({'problems': self.problems, 'counts': counts},
+                indent=2, sort_keys=True)
+
+    def report_text(self):
+        "Return the problems as text, one per line"
+        return '\n'.join("%(file)s:%(row)s: %(severity)s %(check)s: %(message)s" % p
+                for p in self.problems)
+
+    # ===============
+    # Helpers
+    # ===============
+
+    # Read a spreadsheet one row at a time, yielding each row's number in
+    # the file along with its data. Unlike FoodPlannerModel.read_file, we
+    # check each row as it's read, instead of building a list of them first,
+    # and we don't keep the rows around afterwards.
+    def read_rows(self, part, strip=True):
+        for rowNumber, row in SheetReader(cache=False).records(self.settings[part]):
+            if strip:
+                self.model.strip_strings_in_dict(row)
+            yield rowNumber, row
+
+    def is_number(self, value):
+        try:
+            float(value)
+            return True
+        except ValueError:
+            return False
+
+    def error(self, part, rowNumber, check, message):
+        self.add_problem(part, rowNumber, 'error', check, message)
+
+    def warning(self, part, rowNumber, check, message):
+        self.add_problem(part, rowNumber, 'warning', check, message)
+
+    def add_problem(self, part, rowNumber, severity, check, message):
+        self.problems.append({
+            'file': self.settings[part]['file'],
+            'row': rowNumber,
+            'severity': severity,
+            'check': check,
+            'message': message
+        })
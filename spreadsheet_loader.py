@@ -1,5 +1,3 @@
-import requests
-
 # With this class, we can reload spreadsheets from Google Docs automatically
 # whenever we want them!
 class SpreadsheetLoader(object):
@@ -31,7 +29,10 @@ class SpreadsheetLoader(object):
         self.log("Attempting to load a spreadsheet...")
         self.log("Reading from URL %s" % spreadsheet['url'])
 
-        # The requests.get method loads a URL
+        # The requests.get method loads a URL. We import requests here rather
+        # than at the top of the file because it's slow to import, and most
+        # runs of the planner never download anything.
+        import requests
         response = requests.get(spreadsheet['url'])
 
         # Check to see whether the response came back successfully.
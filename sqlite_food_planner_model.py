@@ -0,0 +1,332 @@
+import sqlite3
+from food_planner_model import FoodPlannerModel
+from sheet_reader import SheetReader
+
+# The menu items table holds everything from the menus spreadsheet, plus the
+# properties each menu item picks up along the way: its ingredient's data,
+# and its parsed quantity.
+MENU_ITEM_EXTRAS = ['name', 'buyStore', 'storage', 'buyStoreAlternate',
+        'notes', 'unit', 'parseMethod']
+
+# Each index is a name and the columns it covers. These are the questions
+# the accessor methods ask over and over. The position is in every index
+# (it's the row id), so GROUP BY name, unit can find each group's first row
+# from the name_unit index alone.
+INDEXES = {
+    "ingredients": [
+        ('ingredients_name', ['name']),
+        ('ingredients_buyStore', ['buyStore'])
+    ],
+    "menuItems": [
+        ('menuItems_name', ['name']),
+        ('menuItems_name_unit', ['name', 'unit']),
+        ('menuItems_day_meal', ['day', 'meal'])
+    ],
+    "purchases": [
+        ('purchases_name', ['name']),
+        ('purchases_name_unit', ['name', 'unit'])
+    ]
+}
+
+# SQLiteFoodPlannerModel is a FoodPlannerModel which keeps its data in a
+# SQLite database instead of in Python lists. Everything a view might ask
+# for works just the same, but the accessor methods answer their questions
+# with indexed queries instead of looking through every row, and the
+# reports group and add up rows with GROUP BY instead of in Python. Pass
+# database=':memory:' (the default) to keep the database in memory, or a
+# filename to keep it on disk.
+class SQLiteFoodPlannerModel(FoodPlannerModel):
+
+    def __init__(self, ingredients=None, menus=None, purchases=None,
+            verbose=False, strict=False, warnings=False, load=True,
+            database=':memory:', nutrition=None):
+        # The connection may be handed between threads (PlannerPipeline
+        # does this), but never used by two threads at once.
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        # Keep strings as plain byte strings, just as the csv module gives
+        # them to us.
+        self.connection.text_factory = str
+        self.columns = {
+            "ingredients": ingredients['fieldNames'],
+            "menuItems": self.unique(menus['fieldNames'] + MENU_ITEM_EXTRAS),
+            "purchases": purchases['fieldNames']
+        }
+        for table in self.columns:
+            self.create_table(table)
+        FoodPlannerModel.__init__(self, ingredients=ingredients, menus=menus,
+                purchases=purchases, verbose=verbose, strict=strict,
+                warnings=warnings, load=load, nutrition=nutrition)
+
+    # Instead of building lists, we pour each cleaned-up row straight into
+    # the database, replacing whatever was loaded before, so loading again
+    # (say, when planner_cli.py nutrition --watch sees a change) starts
+    # fresh. Ingredients have to be indexed before the menu items are
+    # loaded, though, because each menu item looks up its ingredient.
+    def load_ingredients(self):
+        "Load the ingredients spreadsheet into the database"
+        self.log("GENERATING INGREDIENTS")
+        self.replace_rows('ingredients', self.clean_ingredients(
+                self.read_file(self.settings['ingredients'])))
+        self.check_ingredient_names(self.query_column(
+                'SELECT name FROM ingredients ORDER BY position'))
+        self.connection.commit()
+        self.changed('ingredients')
+
+    def load_menu_items(self):
+        "Load the menus spreadsheet into the database"
+        self.log("GENERATING MENU ITEMS")
+        errors = []
+        self.replace_rows('menuItems', self.clean_menu_items(
+                self.read_file(self.settings['menus']), errors))
+        self.report_menu_item_errors(errors)
+        self.connection.commit()
+        self.changed('menuItems')
+
+    def load_purchases(self):
+        "Load the purchases spreadsheet into the database"
+        self.replace_rows('purchases', self.clean_purchases(
+                self.read_file(self.settings['purchases'])))
+        self.connection.commit()
+        self.changed('purchases')
+
+    # The rows go straight from the spreadsheet into the database, so we
+    # hand them over one at a time instead of as a list, and don't let
+    # SheetReader keep a copy of them.
+    def read_file(self, fileSettings):
+        "Read in a spreadsheet, yielding a dict for each row"
+        self.log("Attempting to read in %s, skipping the first %s rows" %
+                (fileSettings['file'], fileSettings['rowsToSkip']))
+        for rowNumber, row in SheetReader(cache=False).records(fileSettings):
+            yield row
+
+    # Some reports (the timeline, the search index) still look through
+    # whole lists, so we hand them lists built from the database whenever
+    # they ask. Each one builds a whole list, so the accessors below never
+    # use these.
+    @property
+    def ingredients(self):
+        return self.select_all('ingredients')
+
+    @property
+    def menuItems(self):
+        return self.select_all('menuItems')
+
+    @property
+    def purchases(self):
+        return self.select_all('purchases')
+
+    # ===============
+    # Accessors
+    # ===============
+
+    def get_ingredient(self, itemName):
+        "Look up an ingredient by name, returning False if it's not here"
+        matches = self.query('SELECT * FROM ingredients WHERE name = ? ' +
+                'ORDER BY position LIMIT 1', (itemName,))
+        if any(matches):
+            return self.without_position(matches[0])
+        else:
+            return False
+
+    def get_ingredient_store(self, name):
+        stores = self.query_column('SELECT buyStore FROM ingredients ' +
+                'WHERE name = ? ORDER BY position LIMIT 1', (name,))
+        if any(stores):
+            return stores[0]
+
+    def store_names(self):
+        "Return a list of all store names"
+        return self.query_column('SELECT DISTINCT buyStore FROM ingredients ' +
+                'ORDER BY buyStore')
+
+    def ingredient_names(self):
+        "Return a list of ingredient names"
+        return self.query_column('SELECT name FROM ingredients ORDER BY name')
+
+    def first_records(self, parts):
+        "Return the first record for each name and unit in parts, in order"
+        # The database picks out the first row of each name and unit, so
+        # only those rows ever become dicts.
+        records = []
+        seen = set()
+        for part in parts:
+            for record in self.without_position(self.query(('SELECT * FROM %s ' +
+                    'WHERE position IN (SELECT MIN(position) FROM %s ' +
+                    'GROUP BY name, unit) ORDER BY position') % (part, part))):
+                key = (record['name'], record['unit'])
+                if not key in seen:
+                    seen.add(key)
+                    records.append(record)
+        return records
+
+    def get_menu_item(self, purchase):
+        "Find a matching menu item for a purchase"
+        # An empty day or meal on the purchase matches any day or meal.
+        sql = 'SELECT * FROM menuItems WHERE name = ?'
+        params = [purchase['name']]
+        for prop in ['day', 'meal']:
+            if purchase[prop]:
+                sql += ' AND %s = ?' % prop
+                params.append(purchase[prop])
+        matches = self.query(sql + ' ORDER BY position LIMIT 1', params)
+        if any(matches):
+            return self.without_position(matches[0])
+        self.warn_or_crash("Can't find a menu item matching purchase %s" % purchase)
+
+    def meals(self):
+        # Let the database find each distinct meal in the order it first
+        # appears, then sort them just like FoodPlannerModel does.
+        mealList = [{'day': day, 'meal': meal} for day, meal in self.query_rows(
+                'SELECT day, meal FROM menuItems ' +
+                "WHERE day IS NOT NULL AND day != '' " +
+                "AND meal IS NOT NULL AND meal != '' " +
+                'GROUP BY day, meal ORDER BY MIN(position)')]
+        return sorted(mealList, key=lambda m: int(m['day']) * 100 + int(m['meal'][0]))
+
+    def ingredients_for(self, day, meal):
+        return self.without_position(self.query('SELECT * FROM menuItems ' +
+                'WHERE day = ? AND meal = ? ORDER BY name, position', (day, meal)))
+
+    def menu_item_totals(self):
+        "Return a list of menu items, where items of the same name are joined"
+        # Each (name, unit) total starts out as a copy of the first menu item
+        # using that ingredient with that unit.
+        itemTotals = []
+        totals = self.query_rows('SELECT name, unit, SUM(quantity), ' +
+                'MIN(position) FROM menuItems GROUP BY name, unit ' +
+                'ORDER BY (SELECT MIN(position) FROM ingredients ' +
+                'WHERE ingredients.name = menuItems.name), unit')
+        for name, unit, totalQuantity, firstPosition in totals:
+            ingredientTotal = self.without_position(self.query(
+                    'SELECT * FROM menuItems WHERE position = ?',
+                    (firstPosition,))[0])
+            buyNotes = self.query_column('SELECT notes FROM menuItems ' +
+                    "WHERE name = ? AND unit = ? AND notes != '' " +
+                    'ORDER BY position', (name, unit))
+            buyNotes.append(self.get_ingredient(name)['notes'])
+            ingredientTotal.update({
+                'quantity': totalQuantity,
+                'buyNotes': '; '.join(buyNotes)
+            })
+            itemTotals.append(ingredientTotal)
+        return itemTotals
+
+    def add_purchases(self, purchases):
+        "Add some already-cleaned purchases"
+        self.insert_rows('purchases', purchases)
+        self.connection.commit()
+        self.changed('purchases')
+
+    def clear_purchases(self):
+        "Forget all the purchases"
+        self.connection.execute('DELETE FROM purchases')
+        self.connection.commit()
+        self.changed('purchases')
+
+    def get_quantity_purchased(self, itemName, unit):
+        if self.purchaseTotals is not None:
+            return self.purchaseTotals.get((itemName, unit), 0)
+        return self.query_column('SELECT COALESCE(SUM(count * unitsPerCount), 0) ' +
+                'FROM purchases WHERE name = ? AND unit = ?', (itemName, unit))[0]
+
+    def get_quantity_required(self, itemName, unit):
+        return self.query_column('SELECT COALESCE(SUM(quantity), 0) ' +
+                'FROM menuItems WHERE name = ? AND unit = ?', (itemName, unit))[0]
+
+    def get_purchase_notes(self, name, label=True):
+        purchaseNotes = []
+        for purchase in self.without_position(self.query('SELECT * FROM purchases ' +
+                'WHERE name = ? ORDER BY position', (name,))):
+            labelString = self._note_label('Purchase', purchase, label)
+            if purchase['notes']:
+                purchaseNotes.append(labelString + purchase['notes'])
+            if purchase['description']:
+                purchaseNotes.append(
+                    labelString +
+                    ("%(count)s * (%(unitsPerCount)s %(unit)s) %(description)s from %(shoppingTrip)s" % purchase)
+                )
+        return purchaseNotes
+
+    # Only the menu items with notes, and only the columns the notes need
+    def _get_menu_notes(self, name, prop, label=True):
+        return [self._note_label('Menu', i, label) + i[prop] for i in
+                self.query('SELECT day, meal, %s FROM menuItems ' % self.quote(prop) +
+                "WHERE name = ? AND %s != '' ORDER BY position" % self.quote(prop),
+                (name,))]
+
+    # ===============
+    # Database helpers
+    # ===============
+
+    # Each table gets a position column, so we can always give rows back
+    # in the order they appeared in the spreadsheet. The other columns are
+    # declared without a type, so SQLite hands back exactly the kind of value
+    # we put in (an int stays an int, a float stays a float).
+    def create_table(self, table):
+        "Create an empty table for one of the spreadsheets"
+        self.connection.execute('DROP TABLE IF EXISTS %s' % table)
+        self.connection.execute('CREATE TABLE %s (position INTEGER PRIMARY KEY, %s)' %
+                (table, ', '.join(self.quote(c) for c in self.columns[table])))
+
+    # The indexes are dropped while the rows go in and created again once
+    # they're all in, since that's much faster than keeping them up to
+    # date row by row.
+    def replace_rows(self, table, rows):
+        "Replace everything in a table with rows, and index it"
+        for indexName, indexColumns in INDEXES[table]:
+            self.connection.execute('DROP INDEX IF EXISTS %s' % indexName)
+        self.connection.execute('DELETE FROM %s' % table)
+        self.insert_rows(table, rows)
+        self.create_indexes(table)
+
+    def create_indexes(self, table):
+        for indexName, indexColumns in INDEXES[table]:
+            self.connection.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' %
+                    (indexName, table, ', '.join(self.quote(c) for c in indexColumns)))
+
+    # executemany takes an iterator, so rows go from the csv reader, through
+    # the clean_ generator and into the database one at a time.
+    def insert_rows(self, table, rows):
+        "Insert dicts into a table, using its columns"
+        columns = self.columns[table]
+        self.connection.executemany('INSERT INTO %s (%s) VALUES (%s)' %
+                (table, ', '.join(self.quote(c) for c in columns),
+                ', '.join('?' for c in columns)),
+                ([row.get(c) for c in columns] for row in rows))
+
+    def select_all(self, table):
+        return self.without_position(self.query('SELECT * FROM %s ORDER BY position' % table))
+
+    def query(self, sql, params=()):
+        "Run a query, returning a list of dicts"
+        cursor = self.connection.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def query_rows(self, sql, params=()):
+        "Run a query, returning a list of tuples"
+        return self.connection.execute(sql, params).fetchall()
+
+    def query_column(self, sql, params=()):
+        "Run a query, returning a list of the values in its first column"
+        return [row[0] for row in self.connection.execute(sql, params)]
+
+    def without_position(self, rows):
+        "Remove the position column from a dict or a list of dicts"
+        if isinstance(rows, dict):
+            rows.pop('position', None)
+            return rows
+        for row in rows:
+            row.pop('position', None)
+        return rows
+
+    def quote(self, column):
+        return '"%s"' % column
+
+    def unique(self, items):
+        "Return a list without repeats, keeping the original order"
+        uniqueItems = []
+        for item in items:
+            if not item in uniqueItems:
+                uniqueItems.append(item)
+        return uniqueItems